@@ -76,19 +76,32 @@ def get_package_info():
     return PACKAGE_INFO
 
 # Initialize logging for the package
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 
 def setup_logging(level=logging.INFO):
-    """Setup logging for the crisis assistant"""
-    logging.basicConfig(
-        level=level,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler('crisis_assistant.log') if os.access('.', os.W_OK) else logging.NullHandler()
-        ]
-    )
+    """Setup logging for the crisis assistant
+
+    Records are handed to a queue and written by a listener thread, so callers
+    on the audio path never wait on the console or the log file.
+    """
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.StreamHandler(),
+        logging.FileHandler('crisis_assistant.log') if os.access('.', os.W_OK) else logging.NullHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logging.basicConfig(level=level, handlers=[logging.handlers.QueueHandler(log_queue)])
     return logging.getLogger(__name__)
 
 # Package-level logger
@@ -0,0 +1,298 @@
+"""
+Latency Benchmark
+Drives QueryEngine and CrisisVoiceAssistant over a fixed utterance corpus
+against a mock Ollama server and reports per-stage p50/p95/p99
+
+Usage:
+    python benchmark.py                         # run and compare with benchmark_baseline.json
+    python benchmark.py --save-baseline         # record a new baseline (commit it with the change)
+    python benchmark.py --ollama-url http://localhost:11434   # real server
+    python benchmark.py --audio-dir recordings/ # also replay 16 kHz mono WAVs
+
+Compare time-to-first-token between prompt modes on a real server (the mock
+caches any shared prefix, so it shows no difference between modes):
+    python benchmark.py --ollama-url http://localhost:11434 --prompt-mode inline --baseline inline.json --save-baseline
+    python benchmark.py --ollama-url http://localhost:11434 --prompt-mode chat --baseline inline.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import wave
+
+from config import *
+from incident_journal import journal
+from metrics import metrics
+from mock_ollama import MockOllamaServer
+
+# Stored baseline next to this script, so the check doesn't depend on the working directory
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Fixed corpus: FAQ hits, RAG questions, open-ended prompts and SOS phrases
+BENCHMARK_UTTERANCES = [
+    "my friend is bleeding from a deep cut",
+    "there is fire and smoke in the kitchen",
+    "the flood water is rising and we are trapped",
+    "someone is choking and can't breathe",
+    "I think I have a broken bone in my arm",
+    "how do I treat a burn",
+    "I am lost and don't know my location",
+    "we have no food or water",
+    "how do I perform cpr on an adult",
+    "what should be in a family emergency kit",
+    "what to do during an earthquake",
+    "how to help someone having a panic attack",
+    "signs of heat stroke",
+    "how to purify drinking water after a cyclone",
+    "what are the warning signs of a landslide",
+    "how do I comfort a scared child after a disaster",
+    "snake bite on my leg what do I do",
+    "sos my father is unconscious",
+    "emergency there is a gas leak",
+    "help me my neighbour is stuck under debris",
+]
+
+
+class StubVoiceHandler:
+    """Stands in for VoiceHandler: records what would be spoken instead of using TTS"""
+
+    def __init__(self, speak_delay=0.0):
+        self.speak_delay = speak_delay
+        self.spoken = []
+        self.is_speaking = False
+
+    def speak(self, text):
+        start = time.perf_counter()
+        time.sleep(self.speak_delay)
+        metrics.record("tts_startup", time.perf_counter() - start)
+        self.spoken.append(text)
+
+    def speak_urgent(self, text):
+        start = time.perf_counter()
+        time.sleep(self.speak_delay)
+        metrics.record("tts_urgent_startup", time.perf_counter() - start)
+        self.spoken.append(text)
+
+    def stop_current_speech(self):
+        pass
+
+    def wait_for_speech(self, timeout=60):
+        pass
+
+    def cleanup(self):
+        pass
+
+    def get_status(self):
+        return {"listening": False, "speaking": False, "paused": False}
+
+
+def make_stub_detector(ble_delay=0.0):
+    """EmergencyDetector whose BLE trigger only sleeps, so no radio is touched"""
+    from emergency_detector import EmergencyDetector
+
+    class StubEmergencyDetector(EmergencyDetector):
+        def trigger_sos_sync(self):
+            with metrics.span("ble_trigger"):
+                time.sleep(ble_delay)
+
+    return StubEmergencyDetector()
+
+
+def run_engine(engine, utterances, iterations, cold=False):
+    """Time QueryEngine.process_query over the corpus"""
+    metrics.reset()
+    for _ in range(iterations):
+        for text in utterances:
+            if cold:
+                engine.query_cache.clear()
+            engine.process_query(text)
+    return metrics.snapshot()
+
+
+def run_assistant(assistant, utterances, iterations):
+    """Time CrisisVoiceAssistant.process_voice_input over the corpus"""
+    metrics.reset()
+    for _ in range(iterations):
+        for text in utterances:
+            assistant.process_voice_input(text)
+    # Let background SOS threads finish recording their spans
+    time.sleep(0.5)
+    return metrics.snapshot()
+
+
+def run_audio(audio_dir, iterations):
+    """Replay recorded WAVs through Vosk in BLOCK_SIZE chunks, returning transcripts"""
+    from vosk import KaldiRecognizer, Model
+
+    paths = sorted(glob.glob(os.path.join(audio_dir, "*.wav")))
+    if not paths:
+        print(f"⚠️ No .wav files found in {audio_dir}")
+        return {}, []
+
+    model = Model(VOSK_MODEL_PATH)
+    transcripts = []
+    metrics.reset()
+
+    for iteration in range(iterations):
+        for path in paths:
+            with wave.open(path, "rb") as wf:
+                if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getframerate() != SAMPLE_RATE:
+                    print(f"⚠️ Skipping {path}: needs mono 16-bit {SAMPLE_RATE} Hz")
+                    continue
+                recognizer = KaldiRecognizer(model, SAMPLE_RATE)
+                texts = []
+                while True:
+                    data = wf.readframes(BLOCK_SIZE)
+                    if not data:
+                        break
+                    start = time.perf_counter()
+                    if recognizer.AcceptWaveform(data):
+                        texts.append(json.loads(recognizer.Result()).get("text", ""))
+                        metrics.record("stt_finalize", time.perf_counter() - start)
+
+                start = time.perf_counter()
+                texts.append(json.loads(recognizer.FinalResult()).get("text", ""))
+                metrics.record("stt_finalize", time.perf_counter() - start)
+
+            if iteration == 0:
+                transcript = " ".join(t for t in texts if t).strip()
+                if transcript:
+                    transcripts.append(transcript)
+
+    return metrics.snapshot(), transcripts
+
+
+def find_regressions(results, baseline, tolerance=0.2, min_delta_ms=5.0):
+    """Stages whose p50 or p95 grew by more than tolerance (and min_delta_ms) over baseline"""
+    regressions = []
+    for mode, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get(mode, {}).get(stage)
+            if not previous:
+                continue
+            for key in ("p50_ms", "p95_ms"):
+                before, after = previous[key], current[key]
+                if after - before > min_delta_ms and after > before * (1 + tolerance):
+                    regressions.append((mode, stage, key, before, after))
+    return regressions
+
+
+def print_report(results):
+    for mode, stages in results.items():
+        print(f"\n📊 {mode}")
+        print(f"   {'stage':<20} {'n':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+        for stage, s in stages.items():
+            print(f"   {stage:<20} {s['count']:>6} {s['p50_ms']:>10} {s['p95_ms']:>10} {s['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crisis assistant latency benchmark")
+    parser.add_argument("--mode", choices=["engine", "assistant", "both"], default="both")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--cold", action="store_true", help="clear the query embedding cache per utterance")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="keep the semantic answer cache on (repeat iterations then skip the LLM)")
+    parser.add_argument("--corpus", help="JSON list of utterances to use instead of the built-in corpus")
+    parser.add_argument("--audio-dir", help="directory of recorded 16 kHz mono WAV utterances")
+    parser.add_argument("--ollama-url", help="benchmark a real Ollama server instead of the mock")
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.0,
+                        help="mock prefill cost per uncached prompt word")
+    parser.add_argument("--prompt-mode", choices=["chat", "generate", "inline"],
+                        help="override OLLAMA_PROMPT_MODE")
+    parser.add_argument("--tts-delay", type=float, default=0.0)
+    parser.add_argument("--ble-delay", type=float, default=0.0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", help="write the results JSON here")
+    args = parser.parse_args()
+
+    # Canned queries and mock answers must not end up in the incident record
+    journal.enabled = False
+
+    utterances = BENCHMARK_UTTERANCES
+    if args.corpus:
+        with open(args.corpus, 'r') as f:
+            utterances = json.load(f)
+
+    mock = None
+    if args.ollama_url:
+        ollama_url = args.ollama_url
+    else:
+        mock = MockOllamaServer(
+            first_token_delay=args.first_token_delay,
+            token_delay=args.token_delay,
+            prefill_per_token=args.prefill_ms_per_token / 1000.0
+        ).start()
+        ollama_url = mock.base_url
+        print(f"🧪 Mock Ollama on {ollama_url}")
+
+    results = {}
+    try:
+        if args.audio_dir:
+            audio_stats, transcripts = run_audio(args.audio_dir, args.iterations)
+            if audio_stats:
+                results["audio"] = audio_stats
+            utterances = utterances + transcripts
+
+        from query_engine import QueryEngine
+        engine = QueryEngine()
+        engine.ollama_url = ollama_url
+        if not args.answer_cache:
+            engine.answer_cache = None  # Every iteration must reach the LLM to time it
+        if args.prompt_mode:
+            engine.scheduler.prompt_mode = args.prompt_mode
+
+        # Warm up once so model load and first-call costs don't skew percentiles
+        engine.process_query(utterances[0])
+
+        if args.mode in ("engine", "both"):
+            results["engine"] = run_engine(engine, utterances, args.iterations, cold=args.cold)
+
+        if args.mode in ("assistant", "both"):
+            from main_voice_assistant import CrisisVoiceAssistant
+            assistant = CrisisVoiceAssistant(
+                voice_handler=StubVoiceHandler(args.tts_delay),
+                query_engine=engine,
+                emergency_detector=make_stub_detector(args.ble_delay)
+            )
+            results["assistant"] = run_assistant(assistant, utterances, args.iterations)
+
+        print(f"\n🧠 Query cache: {engine.query_cache.get_stats()}")
+    finally:
+        if mock:
+            mock.stop()
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Baseline saved to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, tolerance=args.tolerance)
+        if regressions:
+            print("\n❌ Regressions against baseline:")
+            for mode, stage, key, before, after in regressions:
+                print(f"   {mode}/{stage} {key}: {before} -> {after}")
+            sys.exit(1)
+        print("\n✅ No regressions against baseline")
+    else:
+        print(f"\nℹ️ No baseline at {args.baseline} (use --save-baseline)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,122 @@
 import os
 
-# Paths
-# PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-PROJECT_ROOT = "D:\Gemma3n_Local\Voice_Assistant"
-MODELS_PATH = os.path.join(PROJECT_ROOT, "Models")
-DATA_PATH = os.path.join(PROJECT_ROOT, "Data")
+import config_loader
+from config_loader import PACKAGE_DIR
+
+# Overrides from config.local.json / CRISIS_* env vars (see config_loader.py)
+_overrides = config_loader.load_overrides()
+
+# Paths: Voice_Assistant/ next to the Responses/ folder holding this package
+PROJECT_ROOT = config_loader.setting(
+    _overrides, "PROJECT_ROOT",
+    os.path.join(os.path.dirname(os.path.dirname(PACKAGE_DIR)), "Voice_Assistant"),
+    base=PACKAGE_DIR
+)
+MODELS_PATH = config_loader.setting(
+    _overrides, "MODELS_PATH", os.path.join(PROJECT_ROOT, "Models"), base=PROJECT_ROOT
+)
+DATA_PATH = config_loader.setting(
+    _overrides, "DATA_PATH", os.path.join(PROJECT_ROOT, "Data"), base=PROJECT_ROOT
+)
+
+# Settings that LANGUAGES is built from take their overrides right here
 
 # Vosk Model
-VOSK_MODEL_PATH = os.path.join(MODELS_PATH, "vosk-model-small-en-us-0.15")
+VOSK_MODEL_PATH = config_loader.setting(
+    _overrides, "VOSK_MODEL_PATH", os.path.join(MODELS_PATH, "vosk-model-small-en-us-0.15"), base=PROJECT_ROOT
+)
 
 # RAG Files
-FAISS_INDEX_PATH = os.path.join(DATA_PATH, "rag_index.faiss")
-METADATA_PATH = os.path.join(DATA_PATH, "rag_metadata.json")
-FAQ_PATH = os.path.join(DATA_PATH, "emergency_faq.json")
+FAISS_INDEX_PATH = config_loader.setting(
+    _overrides, "FAISS_INDEX_PATH", os.path.join(DATA_PATH, "rag_index.faiss"), base=PROJECT_ROOT
+)
+METADATA_PATH = config_loader.setting(
+    _overrides, "METADATA_PATH", os.path.join(DATA_PATH, "rag_metadata.json"), base=PROJECT_ROOT
+)
+FAQ_PATH = config_loader.setting(
+    _overrides, "FAQ_PATH", os.path.join(DATA_PATH, "emergency_faq.json"), base=PROJECT_ROOT
+)
+EMBEDDINGS_PATH = config_loader.setting(
+    _overrides, "EMBEDDINGS_PATH", os.path.join(DATA_PATH, "rag_embeddings.npy"), base=PROJECT_ROOT
+)
+
+# Sentence Encoder
+ENCODER_MODEL_NAME = config_loader.setting(_overrides, "ENCODER_MODEL_NAME", "all-MiniLM-L6-v2")
+ENCODER_BACKEND = "pytorch"  # "pytorch" or "onnx"
+ENCODER_LOCAL_DIR = os.path.join(MODELS_PATH, "all-MiniLM-L6-v2")  # Used instead of the hub when present
+ONNX_MODEL_DIR = os.path.join(MODELS_PATH, "all-MiniLM-L6-v2-onnx")
+ONNX_QUANTIZED = True  # Load the int8 model_quantized.onnx instead of model.onnx
+
+# Embedding Cache
+QUERY_EMBEDDING_CACHE_SIZE = 256  # Max distinct query strings kept in memory
+
+# Index Shards: per-category FAISS indexes written by index_shards.py
+SHARDS_ENABLED = True
+SHARDS_PATH = config_loader.setting(
+    _overrides, "SHARDS_PATH", os.path.join(DATA_PATH, "shards"), base=PROJECT_ROOT
+)
+SOURCE_CATEGORIES = {
+    "Basic_First_Aid_Manual_English.pdf": ["medical_first_aid"],
+    "First-Aid-and-CPR.pdf": ["medical_first_aid"],
+    "first_aid_notes_2019.pdf": ["medical_first_aid"],
+    "iehp112.pdf": ["medical_first_aid"],
+    "Disaster_Preparedness_First_Aid_Handbook.pdf": ["medical_first_aid", "disaster_preparedness"],
+    "All_In_One.pdf": ["disaster_preparedness"],
+    "Do's and Dont's of Different Disaster.pdf": ["disaster_preparedness"],
+    "Community Based Disaster Preparedness-Peripheral Level.pdf": ["disaster_preparedness"],
+    "disaster_management_in_india.pdf": ["disaster_preparedness"],
+    "52828_nationaldisasterriskassessmentpart1.pdf": ["disaster_preparedness"],
+    "Psychological-first-aid-WHO-presentation.pdf": ["psychosocial"],
+}
+DEFAULT_SOURCE_CATEGORIES = ["disaster_preparedness"]  # For sources not listed above
+SHARD_ROUTING_KEYWORDS = {
+    "medical_first_aid": [
+        "bleeding", "blood", "wound", "burn", "cpr", "breath", "choking", "unconscious",
+        "faint", "fracture", "broken", "sprain", "injury", "injured", "poison", "bite", "sting",
+        "heart", "chest pain", "pulse", "seizure", "allergic", "fever", "shock", "bandage", "drowning"
+    ],
+    "disaster_preparedness": [
+        "earthquake", "flood", "cyclone", "tsunami", "landslide", "storm", "lightning", "fire",
+        "smoke", "trapped", "stuck", "collapse", "evacuat", "shelter", "emergency kit", "heat wave",
+        "cold wave", "drought", "gas leak", "water is rising"
+    ],
+    "psychosocial": [
+        "panic", "anxious", "anxiety", "scared", "afraid", "calm", "stress", "trauma", "grief",
+        "crying", "cope", "upset", "distress", "mental", "depress", "suicid", "lonely"
+    ],
+}
+SHARD_HIGH_URGENCY_CATEGORIES = ["medical_first_aid", "disaster_preparedness"]  # When no keyword matches
+
+# Languages: each entry is a full model set, loaded on first use; entries whose
+# Vosk model, index or FAQ is missing are disabled at startup
+DEFAULT_LANGUAGE = "en"
+LANGUAGES = {
+    "en": {
+        "name": "English",
+        "vosk_model": VOSK_MODEL_PATH,
+        "encoder": ENCODER_MODEL_NAME,
+        "faq": FAQ_PATH,
+        "index": FAISS_INDEX_PATH,
+        "metadata": METADATA_PATH,
+        "embeddings": EMBEDDINGS_PATH,
+        "shards": SHARDS_PATH,
+    },
+    "hi": {
+        "name": "Hindi",
+        "vosk_model": os.path.join(MODELS_PATH, "vosk-model-small-hi-0.22"),
+        "encoder": "paraphrase-multilingual-MiniLM-L12-v2",
+        "faq": os.path.join(DATA_PATH, "hi", "emergency_faq.json"),
+        "index": os.path.join(DATA_PATH, "hi", "rag_index.faiss"),
+        "metadata": os.path.join(DATA_PATH, "hi", "rag_metadata.json"),
+        "embeddings": os.path.join(DATA_PATH, "hi", "rag_embeddings.npy"),
+        "shards": os.path.join(DATA_PATH, "hi", "shards"),
+    },
+}
+LANGUAGE_MAX_LOADED = 2  # Model sets kept in RAM; least recently used are unloaded
+LANGUAGE_MIN_IDLE_SECONDS = 120  # A set must be unused this long before it can be unloaded
+LANGUAGE_ID_CANDIDATES = ["en", "hi"]  # Vosk models tried on a session's first utterance
+LANGUAGE_ID_MIN_CONFIDENCE = 0.6  # Below this mean word confidence, use DEFAULT_LANGUAGE
+LANGUAGE_ID_MAX_SECONDS = 10  # Audio buffered from a session's first utterance for identification
 
 # Audio Settings
 SAMPLE_RATE = 16000
@@ -21,6 +125,16 @@ BLOCK_SIZE = 8000
 # Ollama Settings
 OLLAMA_BASE_URL = "http://localhost:11434"
 OLLAMA_MODEL = "gemma3n:latest"
+OLLAMA_TIMEOUT = 100  # Seconds to wait for the server between streamed chunks
+LLM_WORKERS = 1  # Concurrent generations sent to Ollama
+OLLAMA_PROMPT_MODE = "chat"  # "chat", "generate" or "inline"; falls back automatically if unsupported
+OLLAMA_KEEP_ALIVE = "30m"  # Keep the model and its cached system prompt loaded between queries
+
+# Tiered Responses: speak a FAQ/RAG extract at once, then the LLM answer if it
+# arrives within the budget (seconds from query start) for the query's urgency
+TIERED_RESPONSES = True
+TIERED_REFINEMENT = "replace"  # "replace" cuts the extract short, "extend" speaks after it
+LLM_LATENCY_BUDGETS = {"high": 6.0, "low": 20.0}
 
 # TTS Settings
 TTS_RATE = 150
@@ -34,6 +148,91 @@ HIGH_URGENCY_KEYWORDS = [
     "broken bone", "head injury", "allergic reaction", "poisoned", "dying"
 ]
 
+# Semantic Answer Cache: reuse LLM answers (local or from mesh peers) for near-identical questions
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_SIZE = 256
+ANSWER_CACHE_MIN_SIMILARITY = 0.92  # Cosine similarity needed to reuse an answer
+
+# Conversation Memory
+MEMORY_ENABLED = True
+MEMORY_WINDOW_TOKENS = 300  # Recent turns kept verbatim in the prompt
+MEMORY_SUMMARY_TOKENS = 120  # Running summary of older turns
+MEMORY_ANSWER_WORDS = 50  # Assistant answers are truncated to this when stored
+MEMORY_FOLLOW_UP_WEIGHT = 0.5  # Weight of the previous turn when embedding a follow-up
+MEMORY_MAX_SESSIONS = 64
+MEMORY_SESSION_TTL = 3600  # Seconds of inactivity before a session's history is dropped
+
+# Server Mode (crisis_server.py)
+SERVER_HOST = "127.0.0.1"  # Use "0.0.0.0" to accept handsets on the shelter LAN
+SERVER_PORT = 8765
+SERVER_MAX_SESSIONS = 32
+SERVER_MAX_CONCURRENT_QUERIES = 2  # Queries allowed to run against the LLM at once
+SERVER_MAX_QUEUED_QUERIES = 8  # Beyond this, new queries get a "busy" reply
+SERVER_SESSION_IDLE_TIMEOUT = 600  # Seconds before an idle session is closed
+
 # BLE Settings (for SOS device)
 BLE_DEVICE_NAME = "SOS_BEACON"  # Your BLE device name
-BLE_SERVICE_UUID = "12345678-1234-1234-1234-123456789abc"
\ No newline at end of file
+BLE_SERVICE_UUID = "12345678-1234-1234-1234-123456789abc"
+
+# Mesh Relay (mesh_relay.py): SOS events and answers shared with nearby units over LAN multicast
+MESH_ENABLED = False
+MESH_GROUP = "239.255.42.99"
+MESH_PORT = 47474
+MESH_INTERFACE = "0.0.0.0"  # Local address to join on; "127.0.0.1" to test several units on one host
+MESH_NODE_ID = None  # Defaults to a random id per run
+MESH_KEY = None  # Shared secret; when set, unsigned or forged messages are dropped. Answers need it
+MESH_SOS_HOPS = 4  # Times an SOS may be re-broadcast along the mesh
+MESH_ANSWER_HOPS = 1
+MESH_SUPPRESS_COPIES = 2  # Skip a re-broadcast after hearing this many neighbours repeat it
+MESH_SEEN_SIZE = 4096  # Message ids remembered for deduplication
+MESH_MAX_AGE = 3600  # Seconds after which a message is no longer acted on or relayed
+MESH_MAX_ANSWERS_PER_MINUTE = 30  # Published plus relayed answers; SOS events are never limited
+MESH_MAX_ANSWER_CHARS = 900  # Keeps an answer inside one datagram
+
+# Metrics
+METRICS_ENABLED = True
+METRICS_WINDOW = 500  # Samples kept per stage for percentiles
+METRICS_LOG_PATH = None  # e.g. "metrics.jsonl" to append every span
+METRICS_HTTP_PORT = 0  # e.g. 9108 to serve /metrics on localhost, 0 disables
+
+# Incident Journal (incident_journal.py)
+JOURNAL_ENABLED = True
+JOURNAL_DIR = os.path.join(PROJECT_ROOT, "Journal")
+JOURNAL_MAX_BYTES = 5 * 1024 * 1024  # Start a new segment file beyond this size
+JOURNAL_MAX_FILES = 20  # Oldest segments are deleted beyond this count
+JOURNAL_QUEUE_SIZE = 1000  # Events waiting for the writer; overflow is counted, never blocks
+JOURNAL_FSYNC = True  # fsync every written batch so a power cut loses at most one batch
+
+# Hot Reload: swap in edited FAQ / rebuilt index files without restarting
+HOT_RELOAD_ENABLED = True
+HOT_RELOAD_INTERVAL = 2.0  # Seconds between file checks; a change must persist one interval
+
+# Resource Governor (resource_governor.py)
+THREAD_LIMITS = {"torch": 2, "faiss": 2, "onnx": 2, "blas": 1}  # Intra-op threads, None = library default
+AUDIO_THREAD_PRIORITY = True  # Raise the audio capture callback thread (needs privileges on Linux)
+THREAD_NICE_STEP = 5  # Audio callback runs at nice -5, background threads at +5
+OLLAMA_NUM_THREAD = 0  # CPU threads Ollama generates with, 0 lets Ollama decide
+INDEX_TYPE = "flat"  # "flat" (exact) or "sq8" (8-bit scalar quantized, 4x less memory)
+
+# Power Profiles: bundles of the settings above, applied before config overrides
+POWER_PROFILES = {
+    "normal": {},
+    "low_power": {
+        "ENCODER_BACKEND": "onnx",
+        "ONNX_QUANTIZED": True,
+        "OLLAMA_MODEL": "gemma3n:e2b",
+        "OLLAMA_NUM_THREAD": 2,
+        "INDEX_TYPE": "sq8",
+        "THREAD_LIMITS": {"torch": 1, "faiss": 1, "onnx": 1, "blas": 1},
+        "LANGUAGE_MAX_LOADED": 1,
+        "SERVER_MAX_CONCURRENT_QUERIES": 1,
+    },
+}
+POWER_PROFILE = config_loader.setting(_overrides, "POWER_PROFILE", "normal")
+config_loader.apply_profile(globals(), POWER_PROFILES, POWER_PROFILE)
+
+# Apply the remaining overrides last; nothing is derived from these any more.
+# Settings defaulting to None are kept as strings unless given a type here.
+_SETTING_TYPES = {}
+config_loader.apply_overrides(globals(), _overrides, _SETTING_TYPES)
+del _overrides, _SETTING_TYPES
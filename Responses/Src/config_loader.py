@@ -0,0 +1,106 @@
+"""
+Config Loader
+Overrides for config.py from a JSON file and CRISIS_* environment variables
+
+The override file is config.local.json next to config.py, or the path in
+CRISIS_CONFIG_FILE. Environment variables win over the file, e.g.
+    CRISIS_PROJECT_ROOT=/opt/crisis CRISIS_ENCODER_BACKEND=onnx python main_voice_assistant.py
+
+Relative PROJECT_ROOT values are resolved against this package, other
+*_PATH / *_DIR values against PROJECT_ROOT.
+"""
+
+import json
+import os
+
+ENV_PREFIX = "CRISIS_"
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OVERRIDE_FILE = os.path.join(PACKAGE_DIR, "config.local.json")
+
+
+def load_overrides():
+    """Raw overrides: the JSON file first, then CRISIS_* environment variables (as strings)"""
+    overrides = {}
+    path = os.environ.get(ENV_PREFIX + "CONFIG_FILE") or DEFAULT_OVERRIDE_FILE
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                overrides.update(json.load(f))
+            print(f"⚙️ Config overrides loaded from {path}")
+        except Exception as e:
+            print(f"⚠️ Could not read config overrides from {path}: {e}")
+
+    for key, value in os.environ.items():
+        if key.startswith(ENV_PREFIX) and key != ENV_PREFIX + "CONFIG_FILE":
+            overrides[key[len(ENV_PREFIX):]] = value
+    return overrides
+
+
+def coerce(value, default):
+    """Convert an environment string to the type of the setting it replaces
+
+    Settings that default to None stay strings (keys and ids may look like
+    numbers); declare another type for them in apply_overrides' types.
+    """
+    if not isinstance(value, str) or default is None or isinstance(default, str):
+        return value
+    if isinstance(default, bool):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    try:
+        return json.loads(value)  # Lists and dicts
+    except json.JSONDecodeError:
+        return value
+
+
+def is_path_setting(name):
+    return name.endswith("_PATH") or name.endswith("_DIR")
+
+
+def resolve_path(value, base):
+    return os.path.normpath(os.path.join(base, os.path.expanduser(value)))
+
+
+def setting(overrides, name, default, base=None):
+    """One override applied before dependent settings are derived from it"""
+    if name not in overrides:
+        return default
+    value = coerce(overrides.pop(name), default)
+    if base is not None and isinstance(value, str):
+        value = resolve_path(value, base)
+    return value
+
+
+def apply_profile(namespace, profiles, name):
+    """Replace settings with those of a named profile"""
+    if name not in profiles:
+        print(f"⚠️ Unknown power profile '{name}', using defaults")
+        return
+    namespace.update(profiles[name])
+
+
+def apply_overrides(namespace, overrides, types=None):
+    """Apply the remaining overrides to the config module's globals
+
+    types maps settings that default to None to the type of their value
+    (int, float, bool, list or dict); any others are kept as given.
+    """
+    project_root = namespace["PROJECT_ROOT"]
+    for name, value in overrides.items():
+        if name not in namespace or not name.isupper():
+            print(f"⚠️ Unknown config override ignored: {name}")
+            continue
+        default = namespace[name]
+        if default is None and name in (types or {}):
+            default = types[name]()  # An empty value of the declared type
+        try:
+            value = coerce(value, default)
+        except ValueError as e:
+            print(f"⚠️ Invalid value for {name}, keeping {namespace[name]!r}: {e}")
+            continue
+        if is_path_setting(name) and isinstance(value, str):
+            value = resolve_path(value, project_root)
+        namespace[name] = value
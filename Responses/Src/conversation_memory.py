@@ -0,0 +1,142 @@
+"""
+Conversation Memory
+Token-bounded per-session history with incremental summarization of older turns
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from config import *
+
+_FOLLOW_UP_WORDS = {
+    "it", "its", "it's", "still", "next", "again", "they", "he", "she", "him", "her",
+    "them", "same", "else", "worse", "better", "this", "these", "those", "also"
+}
+_FOLLOW_UP_PHRASES = (
+    "what now", "now what", "then what", "and then", "after that", "what about",
+    "how about", "what if", "and if", "tell me more", "what else"
+)
+
+
+def estimate_tokens(text):
+    """Rough token count (about 1.3 tokens per English word) without loading a tokenizer"""
+    return int(len(text.split()) * 1.3) + 1
+
+
+def _first_sentence(text, max_words=20):
+    sentence = re.split(r"(?<=[.!?])\s+", text.strip(), maxsplit=1)[0]
+    words = sentence.split()
+    return " ".join(words[:max_words]) + ("..." if len(words) > max_words else "")
+
+
+def _truncate_words(text, max_words):
+    words = text.split()
+    return " ".join(words[:max_words]) + ("..." if len(words) > max_words else "")
+
+
+class ConversationTurn:
+    def __init__(self, user_text, answer, embedding=None):
+        self.user_text = user_text
+        self.answer = _truncate_words(answer, MEMORY_ANSWER_WORDS)
+        self.embedding = embedding
+        self.tokens = estimate_tokens(self.user_text) + estimate_tokens(self.answer)
+
+
+class ConversationMemory:
+    """Sliding window of recent turns plus a running summary of evicted ones.
+
+    Summarization is extractive and incremental: each turn leaving the window
+    adds one short line (the question and the first sentence of the advice),
+    and the oldest lines are dropped once the summary exceeds its budget. The
+    prompt therefore stays bounded however long an incident runs.
+    """
+
+    def __init__(self, window_tokens=MEMORY_WINDOW_TOKENS, summary_tokens=MEMORY_SUMMARY_TOKENS):
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.turns = deque()
+        self.summary_lines = deque()
+        self.last_active = time.time()
+        self._lock = threading.Lock()
+
+    def add_turn(self, user_text, answer, embedding=None):
+        with self._lock:
+            self.last_active = time.time()
+            self.turns.append(ConversationTurn(user_text, answer, embedding))
+
+            # Always keep the newest turn; fold older ones into the summary
+            while len(self.turns) > 1 and sum(t.tokens for t in self.turns) > self.window_tokens:
+                self._summarize(self.turns.popleft())
+
+    def _summarize(self, turn):
+        self.summary_lines.append(f"- Asked: {_truncate_words(turn.user_text, 15)} Advised: {_first_sentence(turn.answer)}")
+        while len(self.summary_lines) > 1 and sum(estimate_tokens(l) for l in self.summary_lines) > self.summary_tokens:
+            self.summary_lines.popleft()
+
+    def last_turn(self):
+        with self._lock:
+            return self.turns[-1] if self.turns else None
+
+    def is_empty(self):
+        return not self.turns
+
+    def format_history(self):
+        """History block for the prompt: summary of older turns, then recent ones"""
+        with self._lock:
+            lines = []
+            if self.summary_lines:
+                lines.append("Earlier:")
+                lines.extend(self.summary_lines)
+            for turn in self.turns:
+                lines.append(f"User: {turn.user_text}")
+                lines.append(f"You: {turn.answer}")
+            return "\n".join(lines)
+
+
+def is_follow_up(text):
+    """Referential utterances ("is it still bleeding?", "what now?") that need prior context
+
+    Length alone is no cue: "snake bite on leg" is short but starts a new topic.
+    """
+    words = re.findall(r"[a-z']+", text.lower())
+    joined = f" {' '.join(words)} "
+    return any(w in _FOLLOW_UP_WORDS for w in words) or any(f" {p} " in joined for p in _FOLLOW_UP_PHRASES)
+
+
+def blend_with_history(query_vec, history_vec, weight=MEMORY_FOLLOW_UP_WEIGHT):
+    """Mix the previous turn's embedding into a follow-up query for retrieval"""
+    mixed = np.asarray(query_vec, dtype=np.float32) + weight * np.asarray(history_vec, dtype=np.float32)
+    norm = np.linalg.norm(mixed, axis=1, keepdims=True)
+    return mixed / np.clip(norm, 1e-12, None)
+
+
+class ConversationStore:
+    """Per-session memories, capped in count and expired when idle"""
+
+    def __init__(self, max_sessions=MEMORY_MAX_SESSIONS, ttl=MEMORY_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            now = time.time()
+            for key in [k for k, m in self._sessions.items() if now - m.last_active > self.ttl]:
+                del self._sessions[key]
+
+            memory = self._sessions.get(session_id)
+            if memory is None:
+                memory = self._sessions[session_id] = ConversationMemory()
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session_id)
+            return memory
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -0,0 +1,450 @@
+"""
+Crisis Server
+Multi-session WebSocket/HTTP server sharing one set of loaded models
+
+Each handset opens ws://host:port/session?id=<name>&audio=1 and sends either
+binary frames of 16-bit mono PCM at SAMPLE_RATE or JSON text frames:
+
+    {"type": "text", "text": "my friend is bleeding"}
+    {"type": "end"}      # flush the recognizer at end of an utterance
+    {"type": "reset"}    # drop partial audio
+
+The server replies with JSON frames (session, transcript, emergency,
+response, busy, error) and, when audio=1, a JSON "audio" header followed by
+one binary WAV frame. With tiered responses a quick "extract" response
+(final=false) may be followed by the "llm" one. GET /health returns server
+status as JSON.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlparse
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from config import *
+from incident_journal import journal
+from language_router import LanguageRouter
+from mesh_relay import mesh
+from metrics import metrics
+from resource_governor import governor
+from tts_text import clean_response_for_tts
+
+
+class ClientSession:
+    """Per-handset state: its own recognizer on top of a shared language model set"""
+
+    def __init__(self, session_id, websocket, model_set, want_audio=False, language_known=False):
+        self.id = session_id
+        self.websocket = websocket
+        self.model_set = model_set
+        self.recognizer = self._new_recognizer(model_set)
+        self.want_audio = want_audio
+        self.language_known = language_known
+        self.first_audio = bytearray()  # First utterance, kept for language identification
+        self.pending = None
+        self.created = time.time()
+        self.last_active = self.created
+
+    @staticmethod
+    def _new_recognizer(model_set):
+        from vosk import KaldiRecognizer
+
+        return KaldiRecognizer(model_set.vosk_model, SAMPLE_RATE)
+
+    def touch(self):
+        self.last_active = time.time()
+
+    def accept_audio(self, data):
+        """Feed PCM to the recognizer, returning final text when an utterance ends"""
+        if not self.language_known and len(self.first_audio) < LANGUAGE_ID_MAX_SECONDS * SAMPLE_RATE * 2:
+            self.first_audio.extend(data)
+
+        start = time.perf_counter()
+        with governor.cpu("stt"):
+            final = self.recognizer.AcceptWaveform(data)
+        if final:
+            text = json.loads(self.recognizer.Result()).get("text", "").strip()
+            metrics.record("stt_finalize", time.perf_counter() - start)
+            return text
+        return ""
+
+    def flush_audio(self):
+        return json.loads(self.recognizer.FinalResult()).get("text", "").strip()
+
+    def set_language(self, model_set):
+        """Settle on a language; returns the buffered first utterance re-decoded in it"""
+        text = ""
+        if model_set is not self.model_set:
+            self.recognizer = self._new_recognizer(model_set)  # May raise; the session is left as it was
+            self.model_set = model_set
+            if self.first_audio:
+                self.recognizer.AcceptWaveform(bytes(self.first_audio))
+                text = self.flush_audio()
+        self.language_known = True
+        self.first_audio = bytearray()
+        return text
+
+    def is_busy(self):
+        return self.pending is not None and not self.pending.done()
+
+
+_tts_lock = threading.Lock()
+
+
+def synthesize_wav(text, rate=TTS_RATE):
+    """Render text to WAV bytes with pyttsx3 (one engine at a time)"""
+    import pyttsx3
+
+    with _tts_lock:
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            engine = pyttsx3.init()
+            engine.setProperty('rate', rate)
+            engine.setProperty('volume', TTS_VOLUME)
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            engine.stop()
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+class CrisisServer:
+    """Serves many sessions from shared per-language Vosk models, encoders and indexes"""
+
+    def __init__(self, router=None, emergency_detector=None,
+                 host=SERVER_HOST, port=SERVER_PORT, max_sessions=SERVER_MAX_SESSIONS,
+                 max_concurrent=SERVER_MAX_CONCURRENT_QUERIES, max_queued=SERVER_MAX_QUEUED_QUERIES):
+        print("🛰️ Initializing Crisis Server...")
+
+        if emergency_detector is None:
+            from emergency_detector import EmergencyDetector
+            emergency_detector = EmergencyDetector()
+
+        self.router = router or LanguageRouter()
+        self.emergency_detector = emergency_detector
+
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+
+        self.sessions = {}
+        self._connecting = set()  # Session ids holding a slot while their session is created
+        self.waiting = 0
+        self.llm_slots = None  # Created inside the running loop
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="crisis-query")
+        self._ids = itertools.count(1)
+        self._stop = None
+
+    # ---- connection handling -------------------------------------------------
+
+    async def process_request(self, connection, request):
+        """Answer plain HTTP health checks; let WebSocket upgrades through"""
+        if urlparse(request.path).path == "/health":
+            # The resource report scans every process; keep that off the event loop
+            resources = await asyncio.get_running_loop().run_in_executor(None, governor.report)
+            return connection.respond(HTTPStatus.OK, json.dumps(self.get_status(resources)) + "\n")
+        return None
+
+    async def handle_connection(self, websocket):
+        params = parse_qs(urlparse(websocket.request.path).query)
+        session_id = params.get("id", [f"session-{next(self._ids)}"])[0]
+        want_audio = params.get("audio", ["0"])[0] in ("1", "true", "yes")
+        language = params.get("lang", [None])[0]
+
+        # Reserve the slot before awaiting, so concurrent connects can't overshoot the cap
+        if len(self.sessions) + len(self._connecting) >= self.max_sessions:
+            await websocket.close(1013, "server full")
+            return
+        if session_id in self.sessions or session_id in self._connecting:
+            await websocket.close(1008, "session id in use")
+            return
+        self._connecting.add(session_id)
+
+        loop = asyncio.get_running_loop()
+        try:
+            # With a single language there is nothing to identify
+            language_known = language in self.router.languages or len(self.router.languages) < 2
+            model_set = self.router.get(language)
+            try:
+                session = await loop.run_in_executor(
+                    None, ClientSession, session_id, websocket, model_set, want_audio, language_known
+                )
+            except Exception as e:
+                if model_set.code == self.router.default:
+                    raise
+                print(f"⚠️ Could not load {model_set.name} for {session_id}, using the default language: {e}")
+                model_set = self.router.get(self.router.default)
+                session = await loop.run_in_executor(
+                    None, ClientSession, session_id, websocket, model_set, want_audio, False
+                )
+            self.sessions[session_id] = session
+        finally:
+            self._connecting.discard(session_id)
+        print(f"📱 Session connected: {session_id} ({len(self.sessions)} active)")
+        journal.record("session_open", session=session_id, language=model_set.code)
+
+        try:
+            await self._send(session, {"type": "session", "id": session_id, "language": model_set.code})
+
+            async for message in websocket:
+                session.touch()
+
+                if isinstance(message, bytes):
+                    # Recognize inline so a fast sender is throttled by TCP backpressure
+                    text = await loop.run_in_executor(None, session.accept_audio, message)
+                    if text:
+                        await self._on_transcript(session, text)
+                    continue
+
+                try:
+                    request = json.loads(message)
+                except json.JSONDecodeError:
+                    await self._send(session, {"type": "error", "error": "invalid JSON"})
+                    continue
+
+                kind = request.get("type")
+                if kind == "text":
+                    text = str(request.get("text", "")).strip()
+                    if text:
+                        if not session.language_known:
+                            code = self.router.identify_from_text(text)
+                            await self._switch_language(session, code)
+                        journal.record("transcript", session=session.id, text=text, typed=True)
+                        self._submit(session, text)
+                elif kind == "end":
+                    text = await loop.run_in_executor(None, session.flush_audio)
+                    if text:
+                        await self._on_transcript(session, text)
+                elif kind == "reset":
+                    session.recognizer.Reset()
+                else:
+                    await self._send(session, {"type": "error", "error": f"unknown type: {kind}"})
+
+        except ConnectionClosed:
+            pass
+        finally:
+            self.sessions.pop(session_id, None)
+            self.router.forget_session(session_id)
+            print(f"📴 Session closed: {session_id} ({len(self.sessions)} active)")
+            journal.record("session_close", session=session_id)
+
+    async def _on_transcript(self, session, text):
+        if not session.language_known and len(self.router.id_candidates) < 2:
+            session.set_language(session.model_set)  # No second model to decode with
+        elif not session.language_known and session.first_audio:
+            # First utterance: identify the language and re-decode if it differs
+            loop = asyncio.get_running_loop()
+            code = await loop.run_in_executor(None, self.router.identify_from_audio, bytes(session.first_audio))
+            redecoded = await self._switch_language(session, code)
+            text = redecoded or text
+
+        await self._send(session, {"type": "transcript", "text": text, "final": True})
+        journal.record("transcript", session=session.id, text=text)
+        self._submit(session, text)
+
+    async def _switch_language(self, session, code):
+        loop = asyncio.get_running_loop()
+        model_set = self.router.get(code)
+        previous = session.model_set
+        try:
+            text = await loop.run_in_executor(None, session.set_language, model_set)
+        except Exception as e:
+            # Keep the session on the default language rather than dropping it
+            print(f"⚠️ Could not load {model_set.name} for {session.id}, using the default language: {e}")
+            model_set = self.router.get(self.router.default)
+            text = await loop.run_in_executor(None, session.set_language, model_set)
+        changed = model_set is not previous
+        if changed:
+            print(f"🌐 Session {session.id} language: {model_set.name}")
+            await self._send(session, {"type": "language", "language": model_set.code})
+        return text
+
+    # ---- query pipeline ------------------------------------------------------
+
+    def _submit(self, session, text):
+        """Start answering unless the session or the server is saturated"""
+        if self.waiting >= self.max_queued:
+            asyncio.create_task(self._send(session, {
+                "type": "busy", "reason": "server overloaded", "text": text
+            }))
+            return
+
+        # Newer utterance supersedes the one being answered, even if it is still queued
+        engine = session.model_set.loaded_query_engine()
+        generation = engine.begin_query(session.id) if engine is not None else None
+
+        session.pending = asyncio.create_task(self._answer(session, text, engine, generation))
+
+    async def _answer(self, session, text, issuer=None, generation=None):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+
+        try:
+            is_emergency, keyword = self.emergency_detector.detect_sos_in_text(text)
+            if is_emergency:
+                await self._send(session, {"type": "emergency", "keyword": keyword})
+                threading.Thread(
+                    target=self.emergency_detector.handle_emergency,
+                    args=(text, keyword),
+                    daemon=True
+                ).start()
+
+            # Bound concurrent LLM work; excess requests wait here (up to max_queued)
+            self.waiting += 1
+            try:
+                await self.llm_slots.acquire()
+            finally:
+                self.waiting -= 1
+            def on_partial(partial, tier):
+                # Called from the query thread; deliver on the event loop
+                asyncio.run_coroutine_threadsafe(
+                    self._deliver(session, partial, tier, final=(tier in ("faq", "cache"))), loop
+                )
+
+            def run_query():
+                # The language's knowledge base loads here on first use
+                engine = session.model_set.query_engine
+                token = generation if engine is issuer else None  # Reloaded engines count afresh
+                return engine.process_query(
+                    text, session.id, on_partial if TIERED_RESPONSES else None, token
+                )
+
+            try:
+                response = await loop.run_in_executor(self.executor, run_query)
+            finally:
+                self.llm_slots.release()
+
+            if response is None:
+                return  # Superseded, or the quick answer stands
+
+            await self._deliver(session, response, "llm", final=True)
+
+        except ConnectionClosed:
+            pass
+        except Exception as e:
+            print(f"❌ Session {session.id} processing error: {e}")
+            await self._send(session, {"type": "error", "error": "I encountered an error. Please try again."})
+        finally:
+            metrics.record("server_request", time.perf_counter() - start)
+
+    async def _deliver(self, session, text, tier, final):
+        """Send one answer tier as text, followed by its audio if requested"""
+        cleaned = clean_response_for_tts(text)
+        await self._send(session, {"type": "response", "text": cleaned, "tier": tier, "final": final})
+
+        if session.want_audio:
+            wav = await asyncio.get_running_loop().run_in_executor(None, synthesize_wav, cleaned)
+            await self._send(session, {"type": "audio", "format": "wav", "bytes": len(wav), "tier": tier})
+            await session.websocket.send(wav)
+
+    async def _broadcast_mesh_sos(self, message):
+        """Warn every connected handset about an SOS relayed from a nearby unit"""
+        payload = {
+            "type": "mesh_sos",
+            "origin": message.get("o"),
+            "keyword": message.get("kw"),
+            "text": message.get("txt", "")
+        }
+        for session in list(self.sessions.values()):
+            await self._send(session, payload)
+    
+    async def _send(self, session, payload):
+        try:
+            await session.websocket.send(json.dumps(payload))
+        except ConnectionClosed:
+            pass
+
+    # ---- lifecycle -----------------------------------------------------------
+
+    async def _reap_idle_sessions(self):
+        while True:
+            await asyncio.sleep(30)
+            cutoff = time.time() - SERVER_SESSION_IDLE_TIMEOUT
+            for session in list(self.sessions.values()):
+                if session.last_active < cutoff and not session.is_busy():
+                    await session.websocket.close(1000, "idle timeout")
+
+    async def serve_forever(self):
+        self.llm_slots = asyncio.Semaphore(self.max_concurrent)
+        self._stop = asyncio.Event()
+        reaper = asyncio.create_task(self._reap_idle_sessions())
+        
+        if MESH_ENABLED:
+            loop = asyncio.get_running_loop()
+            mesh.sos_listeners.append(
+                lambda message: asyncio.run_coroutine_threadsafe(self._broadcast_mesh_sos(message), loop)
+            )
+            mesh.start()
+
+        async with serve(
+            self.handle_connection,
+            self.host,
+            self.port,
+            process_request=self.process_request,
+            max_size=2 ** 20,
+            max_queue=16
+        ):
+            print(f"✅ Crisis Server listening on ws://{self.host}:{self.port}/session")
+            try:
+                await self._stop.wait()
+            finally:
+                reaper.cancel()
+                mesh.stop()
+                self.executor.shutdown(wait=False)
+
+    def stop(self):
+        if self._stop:
+            self._stop.set()
+
+    def get_status(self, resources=None):
+        return {
+            "sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "busy_sessions": sum(1 for s in self.sessions.values() if s.is_busy()),
+            "waiting_queries": self.waiting,
+            "max_concurrent_queries": self.max_concurrent,
+            "languages": self.router.get_status(),
+            "resources": resources if resources is not None else governor.report(),
+            "mesh": mesh.get_stats() if MESH_ENABLED else None
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the multi-session crisis server")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--max-sessions", type=int, default=SERVER_MAX_SESSIONS)
+    parser.add_argument("--max-concurrent", type=int, default=SERVER_MAX_CONCURRENT_QUERIES)
+    args = parser.parse_args()
+
+    server = CrisisServer(
+        host=args.host,
+        port=args.port,
+        max_sessions=args.max_sessions,
+        max_concurrent=args.max_concurrent
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\n🛑 Crisis Server stopped.")
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Embedding Cache
+Bounded LRU caches for query embeddings and answers, and memory-mapped corpus vectors
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text):
+    """Normalize transcribed text so equivalent utterances share a cache key"""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache of query embeddings keyed on normalized text"""
+
+    def __init__(self, encode_fn, max_size=256):
+        self.encode_fn = encode_fn
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        """Return a (1, dim) float32 embedding for text, encoding only on a miss"""
+        key = normalize_query(text)
+
+        with self._lock:
+            vec = self._cache.get(key)
+            if vec is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vec
+
+        # Encode outside the lock so a slow encode doesn't block other readers
+        vec = np.asarray(self.encode_fn([key]), dtype=np.float32).reshape(1, -1)
+        vec.setflags(write=False)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = vec
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+        return vec
+
+    def peek(self, text):
+        """Return the cached embedding for text, or None, without encoding"""
+        with self._lock:
+            return self._cache.get(normalize_query(text))
+
+    def clear(self):
+        """Drop all cached embeddings"""
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self):
+        """Get cache statistics"""
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+def load_corpus_embeddings(path, index, texts=None, encode_fn=None, source_path=None):
+    """Load corpus vectors as a read-only memmap, building the .npy on first use.
+
+    Vectors are reconstructed from the FAISS index when it stores them (flat
+    indexes do), so the corpus is only ever encoded at build time as a last
+    resort and never on the query path. A .npy older than source_path (the
+    index file) is rebuilt.
+    """
+    expected_rows = index.ntotal if index is not None else len(texts or [])
+    outdated = (
+        source_path is not None and os.path.exists(path) and os.path.exists(source_path)
+        and os.path.getmtime(source_path) > os.path.getmtime(path)
+    )
+
+    if os.path.exists(path) and not outdated:
+        try:
+            embeddings = np.load(path, mmap_mode='r')
+            if embeddings.ndim == 2 and embeddings.shape[0] == expected_rows:
+                return embeddings
+            print(f"⚠️ Stale corpus embeddings at {path} ({embeddings.shape[0]} rows, expected {expected_rows}), rebuilding")
+        except Exception as e:
+            print(f"⚠️ Could not load corpus embeddings: {e}")
+
+    embeddings = None
+    if index is not None:
+        try:
+            embeddings = index.reconstruct_n(0, index.ntotal)
+        except Exception as e:
+            print(f"⚠️ Index cannot reconstruct vectors ({e}), encoding corpus instead")
+
+    if embeddings is None:
+        if not texts or encode_fn is None:
+            return None
+        embeddings = encode_fn(texts)
+
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    # Write to a temp file and rename so a crash never leaves a half-written .npy
+    tmp_path = path + ".tmp.npy"
+    try:
+        np.save(tmp_path, embeddings)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # e.g. Windows refuses to replace a file another engine still has mapped
+        print(f"⚠️ Could not save corpus embeddings ({e}), keeping them in memory")
+        return embeddings
+    print(f"✅ Corpus embeddings saved: {embeddings.shape[0]} x {embeddings.shape[1]}")
+
+    return np.load(path, mmap_mode='r')
+
+
+class SemanticAnswerCache:
+    """LRU of generated answers, looked up by cosine similarity of the query embedding.
+
+    Lets a near-identical question (locally or from a mesh peer) reuse an
+    answer instead of running the LLM again.
+    """
+
+    def __init__(self, max_size=256, min_similarity=0.92):
+        self.max_size = max_size
+        self.min_similarity = min_similarity
+        self._entries = OrderedDict()  # normalized query -> (unit vector, answer, source)
+        self._matrix = None  # Stacked vectors, rebuilt lazily after changes
+        self._keys = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, query_text, query_vec, answer, source="local"):
+        vec = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        vec = vec / max(float(np.linalg.norm(vec)), 1e-12)
+        key = normalize_query(query_text)
+        with self._lock:
+            self._entries[key] = (vec, answer, source)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        """Drop all cached answers"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._keys = []
+
+    def lookup(self, query_vec):
+        """Return (answer, similarity, source) for the closest entry above the threshold, or None"""
+        vec = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        vec = vec / max(float(np.linalg.norm(vec)), 1e-12)
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[k][0] for k in self._keys])
+
+            scores = self._matrix @ vec
+            best = int(np.argmax(scores))
+            if scores[best] < self.min_similarity:
+                self.misses += 1
+                return None
+
+            key = self._keys[best]
+            _, answer, source = self._entries[key]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer, float(scores[best]), source
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses
+            }
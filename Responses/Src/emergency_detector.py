@@ -2,6 +2,9 @@ import asyncio
 import threading
 from bleak import BleakClient, BleakScanner
 from config import *
+from incident_journal import journal
+from mesh_relay import mesh
+from metrics import metrics
 
 class EmergencyDetector:
     def __init__(self):
@@ -42,6 +45,12 @@ class EmergencyDetector:
     
     async def trigger_ble_sos(self):
         """Trigger SOS signal via BLE"""
+        with metrics.span("ble_trigger"):
+            sent = await self._trigger_ble_sos()
+        journal.record("sos_trigger", channel="ble", sent=sent)
+        return sent
+    
+    async def _trigger_ble_sos(self):
         if not self.ble_device:
             self.ble_device = await self.find_ble_device()
         
@@ -81,10 +90,18 @@ class EmergencyDetector:
     def handle_emergency(self, text, detected_keyword):
         """Handle detected emergency situation"""
         print(f"🚨 EMERGENCY DETECTED: '{detected_keyword}' in text: {text}")
+        journal.record("emergency", keyword=detected_keyword, text=text)
         
         # Trigger BLE SOS in background
         print("🔵 Triggering BLE SOS beacon...")
         threading.Thread(target=self.trigger_sos_sync, daemon=True).start()
         
+        # Let nearby units know too (no-op unless the mesh relay is running);
+        # the beacon above must fire whatever happens here
+        try:
+            mesh.publish_sos(detected_keyword, text)
+        except Exception as e:
+            print(f"⚠️ Mesh SOS publish error: {e}")
+        
         # Return emergency acknowledgment
         return f"Emergency detected: {detected_keyword}. SOS beacon activated. Help is being requested."
\ No newline at end of file
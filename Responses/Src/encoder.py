@@ -0,0 +1,135 @@
+"""
+Sentence Encoder Backends
+PyTorch (sentence-transformers) and ONNX Runtime encoders for all-MiniLM-L6-v2
+"""
+
+import json
+import os
+
+import numpy as np
+
+from config import *
+from resource_governor import thread_limit
+
+
+class SentenceTransformerEncoder:
+    """Full PyTorch encoder via sentence-transformers"""
+
+    name = "pytorch"
+
+    def __init__(self, model_name_or_dir):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name_or_dir)
+
+    def encode(self, texts):
+        if isinstance(texts, str):
+            texts = [texts]
+        return np.asarray(self.model.encode(texts), dtype=np.float32)
+
+
+class OnnxEncoder:
+    """ONNX Runtime encoder (optionally int8-quantized) with mean pooling.
+
+    Reads a directory produced by export_onnx_encoder.py, which holds the
+    exported graph, the tokenizer files and an encoder_config.json. Nothing
+    is fetched from the network.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir, quantized=True):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        file_name = "model_quantized.onnx" if quantized else "model.onnx"
+        model_path = os.path.join(model_dir, file_name)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX encoder not found at: {model_path} (run export_onnx_encoder.py first)"
+            )
+
+        settings = {}
+        settings_path = os.path.join(model_dir, "encoder_config.json")
+        if os.path.exists(settings_path):
+            with open(settings_path, 'r') as f:
+                settings = json.load(f)
+        self.max_length = settings.get("max_length", 256)
+        self.normalize = settings.get("normalize", True)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if thread_limit("onnx"):
+            options.intra_op_num_threads = thread_limit("onnx")
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, texts, batch_size=32):
+        if isinstance(texts, str):
+            texts = [texts]
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            tokens = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            feeds = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+            token_embeddings = self.session.run(None, feeds)[0]
+
+            # Mean pooling over real (non-padding) tokens, as in the ST pipeline
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+            batches.append(pooled.astype(np.float32))
+
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(batches)
+
+
+def resolve_encoder_source():
+    """Prefer the local model directory so the encoder loads fully offline"""
+    if os.path.isdir(ENCODER_LOCAL_DIR):
+        return ENCODER_LOCAL_DIR
+    return ENCODER_MODEL_NAME
+
+
+def load_encoder(backend=None, model_name=None):
+    """Create the encoder selected by ENCODER_BACKEND, falling back to PyTorch.
+
+    model_name selects another sentence-transformers model (e.g. a multilingual
+    one); the ONNX export and local directory only cover ENCODER_MODEL_NAME.
+    """
+    backend = backend or ENCODER_BACKEND
+
+    if model_name and model_name != ENCODER_MODEL_NAME:
+        # Same offline preference as the default model: Models/<name> if it was downloaded
+        local_dir = os.path.join(MODELS_PATH, model_name)
+        encoder = SentenceTransformerEncoder(local_dir if os.path.isdir(local_dir) else model_name)
+        print(f"✅ PyTorch encoder loaded ({model_name})")
+        return encoder
+
+    if backend == "onnx":
+        try:
+            encoder = OnnxEncoder(ONNX_MODEL_DIR, quantized=ONNX_QUANTIZED)
+            print(f"✅ ONNX encoder loaded ({'int8' if ONNX_QUANTIZED else 'fp32'})")
+            return encoder
+        except Exception as e:
+            print(f"⚠️ ONNX encoder unavailable, using PyTorch: {e}")
+
+    encoder = SentenceTransformerEncoder(resolve_encoder_source())
+    print("✅ PyTorch encoder loaded")
+    return encoder
@@ -0,0 +1,150 @@
+"""
+ONNX Encoder Export
+Exports all-MiniLM-L6-v2 to ONNX (fp32 + int8) and checks retrieval parity
+
+Usage:
+    python export_onnx_encoder.py            # export into ONNX_MODEL_DIR
+    python export_onnx_encoder.py --verify   # compare against PyTorch on the index
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from config import *
+from encoder import OnnxEncoder, SentenceTransformerEncoder, resolve_encoder_source
+
+# Fixed queries used for the parity check
+PARITY_QUERIES = [
+    "my friend is bleeding heavily from the leg",
+    "how do I do cpr on an adult",
+    "there is smoke everywhere and the door is hot",
+    "the water is rising and we are trapped",
+    "someone is choking and can't breathe",
+    "what should I pack in an emergency kit",
+    "how to treat a burn from boiling water",
+    "a child is unconscious but breathing",
+    "earthquake what do I do after the shaking stops",
+    "how do I calm someone who is panicking",
+    "snake bite on the ankle",
+    "signs of a heart attack",
+]
+
+
+def export(output_dir, opset=14):
+    """Export the transformer to ONNX and write an int8 dynamic-quantized copy"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    source = resolve_encoder_source()
+    print(f"🔄 Loading {source}")
+    st_model = SentenceTransformer(source)
+
+    # Keep a local copy so the PyTorch backend also works offline
+    if not os.path.isdir(ENCODER_LOCAL_DIR):
+        st_model.save(ENCODER_LOCAL_DIR)
+        print(f"✅ Saved local model to {ENCODER_LOCAL_DIR}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    class _TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    dynamic = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _TokenEmbeddings(transformer),
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["token_embeddings"],
+            dynamic_axes={
+                "input_ids": dynamic,
+                "attention_mask": dynamic,
+                "token_type_ids": dynamic,
+                "token_embeddings": dynamic
+            },
+            opset_version=opset
+        )
+    print(f"✅ Exported {fp32_path}")
+
+    int8_path = os.path.join(output_dir, "model_quantized.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"✅ Quantized {int8_path}")
+
+    tokenizer.save_pretrained(output_dir)
+    module_names = [type(module).__name__ for module in st_model]
+    with open(os.path.join(output_dir, "encoder_config.json"), 'w') as f:
+        json.dump({
+            "source": ENCODER_MODEL_NAME,
+            "max_length": st_model.max_seq_length,
+            "pooling": "mean",
+            "normalize": "Normalize" in module_names
+        }, f, indent=2)
+
+
+def verify(model_dir, quantized, top_k=5, min_cosine=0.98, min_overlap=0.8):
+    """Check that ONNX retrieval matches the PyTorch encoder on the existing index"""
+    import faiss
+
+    reference = SentenceTransformerEncoder(resolve_encoder_source())
+    candidate = OnnxEncoder(model_dir, quantized=quantized)
+    index = faiss.read_index(FAISS_INDEX_PATH)
+
+    ref_vecs = reference.encode(PARITY_QUERIES)
+    cand_vecs = candidate.encode(PARITY_QUERIES)
+
+    ref_unit = ref_vecs / np.linalg.norm(ref_vecs, axis=1, keepdims=True)
+    cand_unit = cand_vecs / np.linalg.norm(cand_vecs, axis=1, keepdims=True)
+    cosines = (ref_unit * cand_unit).sum(axis=1)
+
+    _, ref_ids = index.search(ref_vecs, top_k)
+    _, cand_ids = index.search(cand_vecs, top_k)
+    overlaps = [len(set(r) & set(c)) / top_k for r, c in zip(ref_ids, cand_ids)]
+    top1 = sum(r[0] == c[0] for r, c in zip(ref_ids, cand_ids)) / len(PARITY_QUERIES)
+
+    label = "int8" if quantized else "fp32"
+    print(f"📊 ONNX {label} vs PyTorch over {len(PARITY_QUERIES)} queries:")
+    print(f"   min cosine: {cosines.min():.4f}  mean cosine: {cosines.mean():.4f}")
+    print(f"   top-1 agreement: {top1:.0%}  mean top-{top_k} overlap: {np.mean(overlaps):.0%}")
+
+    passed = cosines.min() >= min_cosine and np.mean(overlaps) >= min_overlap
+    print("✅ Parity check passed" if passed else "❌ Parity check failed")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the sentence encoder to ONNX")
+    parser.add_argument("--output-dir", default=ONNX_MODEL_DIR)
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--verify", action="store_true", help="only run the parity check")
+    parser.add_argument("--fp32", action="store_true", help="verify the fp32 model instead of int8")
+    args = parser.parse_args()
+
+    if not args.verify:
+        export(args.output_dir, opset=args.opset)
+
+    if not verify(args.output_dir, quantized=not args.fp32):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
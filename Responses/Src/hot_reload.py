@@ -0,0 +1,89 @@
+"""
+Hot Reload
+Watches the FAQ and index files behind each query engine and swaps in new versions
+"""
+
+import os
+import threading
+import weakref
+
+from config import *
+from resource_governor import governor
+
+
+def _signature(paths):
+    """Modification time and size of each file (None if missing)"""
+    result = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            result.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            result.append(None)
+    return tuple(result)
+
+
+class KnowledgeWatcher:
+    """Polls the files of registered engines and reloads a group once its files settle.
+
+    An engine exposes watched_files() -> {group: [paths]} and reload(group).
+    A group is reloaded only after its files have looked the same for one full
+    interval, so a half-copied index is never picked up. A file that fails to
+    load is not retried until it changes again; the engine keeps its old data.
+    Engines are held weakly, so unloaded languages simply drop out.
+    """
+
+    def __init__(self, interval=HOT_RELOAD_INTERVAL):
+        self.interval = interval
+        self._loaded = weakref.WeakKeyDictionary()  # engine -> {group: signature in use}
+        self._pending = weakref.WeakKeyDictionary()  # engine -> {group: signature seen last poll}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def watch(self, engine):
+        """Start watching an engine's files as they are now"""
+        with self._lock:
+            self._loaded[engine] = {
+                group: _signature(paths) for group, paths in engine.watched_files().items()
+            }
+            self._pending[engine] = {}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="knowledge-watcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        governor.lower_current_thread()  # Reloads build indexes; keep them behind live queries
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """Run one polling pass over every watched engine"""
+        with self._lock:
+            engines = list(self._loaded.items())
+
+        for engine, loaded in engines:
+            pending = self._pending.get(engine, {})
+            for group, paths in engine.watched_files().items():
+                current = _signature(paths)
+                if current == loaded.get(group):
+                    pending.pop(group, None)
+                    continue
+                if pending.get(group) != current:
+                    pending[group] = current  # Changed; wait for the writer to finish
+                    continue
+
+                pending.pop(group, None)
+                loaded[group] = current
+                try:
+                    engine.reload(group)
+                    print(f"🔄 Reloaded {group} files")
+                except Exception as e:
+                    print(f"⚠️ Could not reload {group} files, keeping the current ones: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+
+# Shared watcher used by all query engines
+knowledge_watcher = KnowledgeWatcher()
@@ -0,0 +1,255 @@
+"""
+Incident Journal
+Append-only, rotated JSONL record of transcripts, detections, SOS triggers and answers
+
+Events are queued without blocking and written by a background thread, so the
+audio loop never waits on disk. Reading and exporting:
+    python incident_journal.py                          # print every event
+    python incident_journal.py --type emergency --type sos_trigger
+    python incident_journal.py --since 2025-08-01T10:00 --format csv --output incident.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+from config import *
+from resource_governor import governor
+
+_STOP = object()
+_SEGMENT_PREFIX = "incidents-"
+_SEGMENT_SUFFIX = ".jsonl"
+
+
+class IncidentJournal:
+    """Bounded-queue journal writer; when the queue is full events are counted, not waited on"""
+
+    def __init__(self, journal_dir=JOURNAL_DIR, enabled=JOURNAL_ENABLED, max_bytes=JOURNAL_MAX_BYTES,
+                 max_files=JOURNAL_MAX_FILES, queue_size=JOURNAL_QUEUE_SIZE, fsync=JOURNAL_FSYNC):
+        self.journal_dir = journal_dir
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.fsync = fsync
+        self.dropped = 0
+        self.written = 0
+        self._seq = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._file = None
+        self._file_size = 0
+
+    def record(self, event_type, **fields):
+        """Queue one event; never blocks the caller"""
+        if not self.enabled or self._closed:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="incident-journal", daemon=True)
+                self._thread.start()
+            self._seq += 1
+            entry = {"ts": round(time.time(), 3), "seq": self._seq, "type": event_type}
+
+        entry.update(fields)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    # ---- writer thread -------------------------------------------------------
+
+    def _run(self):
+        governor.lower_current_thread()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(entry is _STOP for entry in batch)
+            try:
+                self._write([entry for entry in batch if entry is not _STOP])
+            except Exception as e:
+                print(f"⚠️ Incident journal write failed: {e}")
+            if stop:
+                self._close_file()
+                return
+
+    def _write(self, batch):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            batch.insert(0, {"ts": round(time.time(), 3), "type": "journal_dropped", "count": dropped})
+        if not batch:
+            return
+
+        data = "".join(
+            json.dumps(entry, separators=(",", ":"), ensure_ascii=False, default=str) + "\n"
+            for entry in batch
+        ).encode("utf-8")
+
+        if self._file is None or self._file_size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._file_size += len(data)
+        self.written += len(batch)
+
+    def _rotate(self):
+        """Start a new segment and delete the oldest beyond max_files"""
+        self._close_file()
+        os.makedirs(self.journal_dir, exist_ok=True)
+
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{int(now * 1000) % 1000:03d}"
+        path = os.path.join(self.journal_dir, f"{_SEGMENT_PREFIX}{stamp}{_SEGMENT_SUFFIX}")
+        self._file = open(path, 'ab')
+        self._file_size = self._file.tell()
+
+        for old in list_segments(self.journal_dir)[:-self.max_files]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def _close_file(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def close(self, timeout=5):
+        """Write out everything queued so far and stop the writer"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped
+            }
+
+
+def list_segments(journal_dir=JOURNAL_DIR):
+    """Journal segment paths, oldest first"""
+    if not os.path.isdir(journal_dir):
+        return []
+    names = sorted(
+        n for n in os.listdir(journal_dir)
+        if n.startswith(_SEGMENT_PREFIX) and n.endswith(_SEGMENT_SUFFIX)
+    )
+    return [os.path.join(journal_dir, n) for n in names]
+
+
+def read_journal(journal_dir=JOURNAL_DIR, types=None, since=None, until=None, session=None):
+    """Yield journal events in order, filtered by type, time range (epoch seconds) and session.
+
+    A line torn by a crash or power cut is skipped rather than ending the read.
+    """
+    for path in list_segments(journal_dir):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if types and entry.get("type") not in types:
+                    continue
+                if since is not None and entry.get("ts", 0) < since:
+                    continue
+                if until is not None and entry.get("ts", 0) > until:
+                    continue
+                if session is not None and entry.get("session") != session:
+                    continue
+                yield entry
+
+
+def _format_time(ts):
+    return datetime.fromtimestamp(ts).isoformat(sep=" ", timespec="seconds")
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def export(entries, out, fmt="text"):
+    """Write events as JSONL, CSV or a readable timeline"""
+    if fmt == "jsonl":
+        for entry in entries:
+            out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return
+
+    if fmt == "csv":
+        entries = list(entries)
+        fields = ["time", "type", "session"]
+        for entry in entries:
+            fields += [k for k in entry if k not in fields and k not in ("ts", "seq")]
+        writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for entry in entries:
+            writer.writerow(dict(entry, time=_format_time(entry.get("ts", 0))))
+        return
+
+    for entry in entries:
+        details = " ".join(f"{k}={v}" for k, v in entry.items() if k not in ("ts", "seq", "type"))
+        out.write(f"{_format_time(entry.get('ts', 0))}  {entry.get('type', '?'):<14} {details}\n")
+
+
+# Shared journal used by all components
+journal = IncidentJournal()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read and export the incident journal")
+    parser.add_argument("--dir", default=JOURNAL_DIR)
+    parser.add_argument("--type", action="append", help="only this event type (repeatable)")
+    parser.add_argument("--session", help="only events from this session")
+    parser.add_argument("--since", help="ISO time, e.g. 2025-08-01T10:00")
+    parser.add_argument("--until", help="ISO time")
+    parser.add_argument("--format", choices=["text", "jsonl", "csv"], default="text")
+    parser.add_argument("--output", help="write to this file instead of stdout")
+    args = parser.parse_args()
+
+    entries = read_journal(
+        args.dir,
+        types=set(args.type) if args.type else None,
+        since=_parse_time(args.since),
+        until=_parse_time(args.until),
+        session=args.session
+    )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            export(entries, f, args.format)
+        print(f"✅ Journal exported to {args.output}")
+    else:
+        export(entries, sys.stdout, args.format)
+
+
+if __name__ == "__main__":
+    main()
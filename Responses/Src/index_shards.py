@@ -0,0 +1,196 @@
+"""
+Index Shards
+Per-category FAISS shards of the RAG corpus, routed by query keywords and urgency
+
+Usage:
+    python index_shards.py    # tag rag_metadata.json and write the shards
+
+Tags are recomputed from SOURCE_CATEGORIES on every run. To pin a chunk to
+other categories, give it a "categories_override" list in rag_metadata.json.
+"""
+
+import argparse
+import json
+import os
+
+import faiss
+import numpy as np
+
+from config import *
+
+MANIFEST_NAME = "shards.json"
+
+
+def source_categories(meta):
+    """Categories a chunk should be tagged with: its hand override, else its source document's"""
+    return meta.get("categories_override") or SOURCE_CATEGORIES.get(meta.get("source"), DEFAULT_SOURCE_CATEGORIES)
+
+
+def chunk_categories(meta):
+    """Categories of one chunk: the tags written by tag_metadata, else computed afresh"""
+    return meta.get("categories") or source_categories(meta)
+
+
+def route_categories(query_text, urgency="low"):
+    """Shards worth searching for a query; an empty list means search everything"""
+    query_lower = query_text.lower()
+    categories = [
+        category for category, keywords in SHARD_ROUTING_KEYWORDS.items()
+        if any(keyword in query_lower for keyword in keywords)
+    ]
+    if not categories and urgency == "high":
+        categories = list(SHARD_HIGH_URGENCY_CATEGORIES)
+    return categories
+
+
+class IndexShard:
+    """A FAISS index over one category, with its rows mapped back to corpus ids"""
+
+    def __init__(self, category, index, ids):
+        self.category = category
+        self.index = index
+        self.ids = np.asarray(ids, dtype=np.int64)
+
+    def search(self, query_vec, top_k):
+        D, I = self.index.search(query_vec, min(top_k, self.index.ntotal))
+        return D[0], np.where(I[0] >= 0, self.ids[I[0]], -1)
+
+
+def make_index(vectors, metric=faiss.METRIC_L2, index_type=INDEX_TYPE):
+    """Build an exact flat index, or an 8-bit scalar-quantized one with a quarter of the memory"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, metric)
+        index.train(vectors)
+    else:
+        index = faiss.IndexFlat(vectors.shape[1], metric)
+    index.add(vectors)
+    return index
+
+
+def build_shards(vectors, metadata, metric=faiss.METRIC_L2, index_type=INDEX_TYPE):
+    """Split corpus vectors into one index per category (a chunk may be in several)"""
+    groups = {}
+    for i, meta in enumerate(metadata):
+        for category in chunk_categories(meta):
+            groups.setdefault(category, []).append(i)
+
+    shards = {}
+    for category, ids in groups.items():
+        shards[category] = IndexShard(category, make_index(vectors[ids], metric, index_type), ids)
+    return shards
+
+
+def convert_shards(shards, index_type=INDEX_TYPE):
+    """Rebuild exact shards (as written by the CLI) as index_type, from their own vectors"""
+    if index_type == "flat":
+        return shards
+    converted = {}
+    for category, shard in shards.items():
+        index = shard.index
+        if isinstance(index, faiss.IndexFlat):
+            index = make_index(index.reconstruct_n(0, index.ntotal), index.metric_type, index_type)
+        converted[category] = IndexShard(category, index, shard.ids)
+    return converted
+
+
+def search_shards(shards, categories, query_vec, top_k):
+    """Search the selected shards and merge into FAISS-style (D, I) with corpus ids"""
+    selected = [shards[c] for c in categories if c in shards]
+    if not selected:
+        return None, None
+
+    # Inner-product scores grow with similarity, L2 distances shrink
+    larger_is_better = selected[0].index.metric_type == faiss.METRIC_INNER_PRODUCT
+    sign = -1.0 if larger_is_better else 1.0
+
+    # A chunk tagged with several categories can come back from more than one shard
+    best = {}
+    for shard in selected:
+        for distance, idx in zip(*shard.search(query_vec, top_k)):
+            if idx >= 0 and (idx not in best or sign * distance < sign * best[idx]):
+                best[idx] = distance
+
+    ranked = sorted(best.items(), key=lambda item: sign * item[1])[:top_k]
+    D = np.full((1, top_k), sign * np.inf, dtype=np.float32)
+    I = np.full((1, top_k), -1, dtype=np.int64)
+    for rank, (idx, distance) in enumerate(ranked):
+        D[0, rank] = distance
+        I[0, rank] = idx
+    return D, I
+
+
+def save_shards(shards, shards_dir, ntotal):
+    """Write each shard and a manifest tying it to the corpus it was built from"""
+    os.makedirs(shards_dir, exist_ok=True)
+    manifest = {"ntotal": ntotal, "shards": {}}
+    for category, shard in shards.items():
+        file_name = f"{category}.faiss"
+        faiss.write_index(shard.index, os.path.join(shards_dir, file_name))
+        manifest["shards"][category] = {"index": file_name, "ids": shard.ids.tolist()}
+
+    # The manifest goes last and atomically, so readers never see a partial set
+    tmp_path = os.path.join(shards_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(shards_dir, MANIFEST_NAME))
+
+
+def load_shards(shards_dir, ntotal, source_path=None):
+    """Load shards written by save_shards, or None if missing or built from another corpus"""
+    manifest_path = os.path.join(shards_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    if source_path and os.path.exists(source_path) and os.path.getmtime(source_path) > os.path.getmtime(manifest_path):
+        print(f"⚠️ Index shards at {shards_dir} are older than {source_path}")
+        return None
+
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get("ntotal") != ntotal:
+        print(f"⚠️ Stale index shards at {shards_dir} ({manifest.get('ntotal')} chunks, expected {ntotal})")
+        return None
+
+    shards = {}
+    for category, entry in manifest["shards"].items():
+        index = faiss.read_index(os.path.join(shards_dir, entry["index"]))
+        shards[category] = IndexShard(category, index, entry["ids"])
+    return shards
+
+
+def tag_metadata(metadata_path):
+    """(Re)write the "categories" tag of every chunk in the metadata file"""
+    with open(metadata_path, 'r') as f:
+        data = json.load(f)
+    for meta in data["meta"]:
+        meta["categories"] = list(source_categories(meta))
+
+    tmp_path = metadata_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, metadata_path)
+    return data["meta"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build per-category FAISS shards of the RAG index")
+    parser.add_argument("--index", default=FAISS_INDEX_PATH)
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    parser.add_argument("--output", default=SHARDS_PATH)
+    args = parser.parse_args()
+
+    index = faiss.read_index(args.index)
+    metadata = tag_metadata(args.metadata)
+    if len(metadata) != index.ntotal:
+        raise SystemExit(f"❌ Metadata has {len(metadata)} chunks but the index has {index.ntotal}")
+
+    shards = build_shards(index.reconstruct_n(0, index.ntotal), metadata, index.metric_type, "flat")
+    save_shards(shards, args.output, index.ntotal)
+
+    for category, shard in sorted(shards.items()):
+        print(f"   {category:<24} {shard.index.ntotal:>6} chunks")
+    print(f"✅ {len(shards)} shards written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
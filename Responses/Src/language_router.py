@@ -0,0 +1,230 @@
+"""
+Language Router
+Per-language model sets (Vosk, encoder, FAQ, index) loaded lazily with LRU eviction
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from config import *
+from resource_governor import governor
+
+# Unicode blocks for scripts used by the configured Indian languages
+_SCRIPT_RANGES = {
+    "hi": (0x0900, 0x097F),  # Devanagari
+    "bn": (0x0980, 0x09FF),  # Bengali
+    "ta": (0x0B80, 0x0BFF),  # Tamil
+    "te": (0x0C00, 0x0C7F),  # Telugu
+    "kn": (0x0C80, 0x0CFF),  # Kannada
+    "ml": (0x0D00, 0x0D7F),  # Malayalam
+}
+
+_LATIN_STOPWORDS = {
+    "en": {"the", "is", "and", "my", "help", "i", "a", "to", "of", "it", "what", "how"},
+    "fr": {"le", "la", "les", "je", "est", "et", "un", "une", "des", "il", "mon", "aide", "au", "secours"},
+}
+
+
+# Files a language can't be served without; checked before it is offered at all
+_REQUIRED_FILES = ("vosk_model", "index", "faq")
+
+
+def missing_files(settings):
+    return [settings[key] for key in _REQUIRED_FILES if not os.path.exists(settings.get(key) or "")]
+
+
+class LanguageModelSet:
+    """Everything needed to serve one language; each part loads on first use"""
+
+    def __init__(self, code, settings, router):
+        self.code = code
+        self.settings = settings
+        self.router = router
+        self.last_used = time.time()
+        self._vosk_model = None
+        self._query_engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.settings.get("name", self.code)
+
+    @property
+    def vosk_model(self):
+        self.last_used = time.time()
+        with self._lock:
+            if self._vosk_model is None:
+                from vosk import Model
+
+                path = self.settings["vosk_model"]
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"Vosk model for '{self.code}' not found at: {path}")
+                print(f"🔄 Loading {self.name} Vosk model from: {path}")
+                with governor.loading("stt"):
+                    self._vosk_model = Model(path)
+            return self._vosk_model
+
+    @property
+    def query_engine(self):
+        self.last_used = time.time()
+        with self._lock:
+            if self._query_engine is None:
+                from query_engine import QueryEngine
+
+                print(f"🔄 Loading {self.name} knowledge base...")
+                self._query_engine = QueryEngine(
+                    faiss_index_path=self.settings["index"],
+                    metadata_path=self.settings["metadata"],
+                    faq_path=self.settings["faq"],
+                    embeddings_path=self.settings["embeddings"],
+                    encoder=self.router.get_encoder(self.settings.get("encoder", ENCODER_MODEL_NAME)),
+                    scheduler=self.router.scheduler,
+                    language_name=self.name,
+                    shards_dir=self.settings.get("shards", SHARDS_PATH)
+                )
+            return self._query_engine
+
+    def loaded_query_engine(self):
+        """The query engine if it is already loaded, without loading it"""
+        return self._query_engine
+
+    def is_loaded(self):
+        return self._vosk_model is not None or self._query_engine is not None
+
+    def unload(self):
+        with self._lock:
+            self._vosk_model = None
+            self._query_engine = None
+
+
+class LanguageRouter:
+    """Serves model sets by language code, keeping at most max_loaded in memory.
+
+    Once the cap is exceeded, sets idle for at least LANGUAGE_MIN_IDLE_SECONDS
+    are evicted least-recently-used first; busy sets are never thrashed. Vosk
+    reference-counts models in C, so recognizers already created from an
+    evicted model keep working until their sessions end.
+
+    Languages whose Vosk model, index or FAQ is missing are left out (the
+    default language is always kept), so they are never identified or chosen.
+    """
+
+    def __init__(self, languages=LANGUAGES, default=DEFAULT_LANGUAGE,
+                 max_loaded=LANGUAGE_MAX_LOADED, scheduler=None):
+        from llm_scheduler import LLMScheduler
+
+        self.languages = {}
+        for code, settings in languages.items():
+            missing = missing_files(settings)
+            if missing and code != default:
+                print(f"⚠️ {settings.get('name', code)} disabled, missing: {', '.join(missing)}")
+                continue
+            self.languages[code] = settings
+        self.id_candidates = [code for code in LANGUAGE_ID_CANDIDATES if code in self.languages]
+        self.default = default
+        self.max_loaded = max_loaded
+        self.scheduler = scheduler or LLMScheduler(OLLAMA_BASE_URL)  # One Ollama for all languages
+        self._sets = OrderedDict((code, LanguageModelSet(code, s, self)) for code, s in self.languages.items())
+        self._encoders = {}
+        self._lock = threading.Lock()
+
+    def get(self, code=None):
+        """Model set for a language (default if unknown), marking it recently used"""
+        code = code if code in self._sets else self.default
+        with self._lock:
+            model_set = self._sets[code]
+            model_set.last_used = time.time()
+            self._sets.move_to_end(code)
+            self._evict_locked(keep=code)
+        return model_set
+
+    def _evict_locked(self, keep):
+        loaded = [s for s in self._sets.values() if s.is_loaded() or s.code == keep]
+        idle_cutoff = time.time() - LANGUAGE_MIN_IDLE_SECONDS
+        for model_set in list(loaded):
+            if len(loaded) <= self.max_loaded:
+                break
+            if model_set.code == keep or model_set.last_used > idle_cutoff:
+                continue
+            print(f"♻️ Unloading idle {model_set.name} models")
+            model_set.unload()
+            loaded.remove(model_set)
+
+        # Drop encoders no loaded language still uses
+        in_use = {s.settings.get("encoder", ENCODER_MODEL_NAME) for s in loaded}
+        for name in [n for n in self._encoders if n not in in_use]:
+            del self._encoders[name]
+
+    def get_encoder(self, model_name):
+        """Share one encoder between languages that use the same embedding model"""
+        with self._lock:
+            encoder = self._encoders.get(model_name)
+            if encoder is None:
+                from encoder import load_encoder
+
+                with governor.loading("encoder"):
+                    encoder = self._encoders[model_name] = load_encoder(model_name=model_name)
+            return encoder
+
+    def identify_from_text(self, text):
+        """Cheap language guess from script, then stopwords for Latin text"""
+        counts = {}
+        for char in text:
+            point = ord(char)
+            for code, (low, high) in _SCRIPT_RANGES.items():
+                if low <= point <= high:
+                    counts[code] = counts.get(code, 0) + 1
+        if counts:
+            code = max(counts, key=counts.get)
+            return code if code in self.languages else self.default
+
+        words = set(re.findall(r"[a-zàâçéèêëîïôûùüÿœ']+", text.lower()))
+        scores = {code: len(words & stop) for code, stop in _LATIN_STOPWORDS.items() if code in self.languages}
+        if scores and max(scores.values()) > 0:
+            return max(scores, key=scores.get)
+        return self.default
+
+    def identify_from_audio(self, pcm, candidates=None):
+        """Decode the utterance with each candidate's Vosk model; keep the most confident"""
+        from vosk import KaldiRecognizer
+
+        best_code, best_score = self.default, 0.0
+        for code in candidates or self.id_candidates:
+            if code not in self.languages:
+                continue
+            try:
+                recognizer = KaldiRecognizer(self.get(code).vosk_model, SAMPLE_RATE)
+            except FileNotFoundError as e:
+                print(f"⚠️ {e}")
+                continue
+            recognizer.SetWords(True)
+            recognizer.AcceptWaveform(bytes(pcm))
+            words = json.loads(recognizer.FinalResult()).get("result", [])
+            if not words:
+                continue
+            score = sum(w.get("conf", 0.0) for w in words) / len(words)
+            if score > best_score:
+                best_code, best_score = code, score
+
+        if best_score < LANGUAGE_ID_MIN_CONFIDENCE:
+            return self.default
+        return best_code
+
+    def forget_session(self, session_id):
+        """Drop a session's conversation history in every loaded language"""
+        for model_set in list(self._sets.values()):
+            engine = model_set.loaded_query_engine()
+            if engine is not None and engine.memory is not None:
+                engine.memory.clear(session_id)
+
+    def get_status(self):
+        with self._lock:
+            return {
+                "loaded": [s.code for s in self._sets.values() if s.is_loaded()],
+                "encoders": list(self._encoders),
+                "max_loaded": self.max_loaded
+            }
@@ -0,0 +1,322 @@
+"""
+LLM Scheduler
+Priority queue in front of Ollama with cancellation and in-flight deduplication
+"""
+
+import itertools
+import json
+import queue
+import threading
+import time
+
+import requests
+
+from config import *
+from metrics import metrics
+from resource_governor import governor
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+# Prompt modes, best first. "chat" sends the static system prompt as its own
+# message so Ollama can reuse the KV cache for it; "generate" uses the
+# /api/generate system field; "inline" prepends it to every prompt.
+PROMPT_MODES = ["chat", "generate", "inline"]
+
+GENERATION_OPTIONS = {
+    "temperature": 0.3,
+    "top_p": 0.8,
+    "num_predict": 200
+}
+
+
+def _error_message(response):
+    """The "error" field of an Ollama error response, else the start of its body"""
+    try:
+        return str(response.json().get("error", ""))
+    except ValueError:
+        return response.text.strip()[:200]
+
+
+def _is_model_error(message):
+    """Ollama answers 404 both for unknown endpoints and for models it doesn't have"""
+    message = message.lower()
+    return "model" in message and "not found" in message
+
+
+class GenerationJob:
+    """One Ollama generation, possibly shared by several identical requests"""
+
+    def __init__(self, key, prompt, priority, system=None):
+        self.key = key
+        self.prompt = prompt
+        self.system = system
+        self.priority = priority
+        self.handles = set()
+        self.submitted = time.perf_counter()
+        self.started = False
+        self.cancel_event = threading.Event()
+        self.response = None  # Open HTTP stream while generating
+        self.result = None
+        self.failed = False  # result is an error message to speak, not an answer
+
+
+class GenerationHandle:
+    """A caller's view of a job; cancelling it only stops the job if no one else waits"""
+
+    def __init__(self, scheduler, job, group=None):
+        self.scheduler = scheduler
+        self.job = job
+        self.group = group
+        self.cancelled = False
+        self._event = threading.Event()
+
+    def result(self, timeout=None):
+        """Block until the text is ready; None if cancelled or timed out"""
+        if not self._event.wait(timeout) or self.cancelled:
+            return None
+        return self.job.result
+
+    def done(self):
+        return self._event.is_set()
+
+    def succeeded(self):
+        """True once a real answer (not an error message) is ready for this caller"""
+        return self.done() and not self.cancelled and not self.job.failed and self.job.result is not None
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+
+class LLMScheduler:
+    """Runs Ollama generations from a priority queue on a few worker threads.
+
+    - Higher-urgency prompts are served first.
+    - Submitting with a group (e.g. a session id) supersedes that group's
+      previous request, closing its stream so Ollama stops generating.
+    - Identical prompts already queued or running share a single generation.
+    """
+
+    def __init__(self, base_url=OLLAMA_BASE_URL, workers=LLM_WORKERS, prompt_mode=OLLAMA_PROMPT_MODE):
+        self.base_url = base_url
+        self.prompt_mode = prompt_mode
+        self._queue = queue.PriorityQueue()
+        self._inflight = {}
+        self._groups = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self.stats = {"submitted": 0, "generated": 0, "deduplicated": 0, "cancelled": 0}
+
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True).start()
+
+    def submit(self, prompt, priority=PRIORITY_NORMAL, group=None, system=None):
+        """Queue a prompt (with an optional static system prompt) and return a GenerationHandle"""
+        key = (system, prompt)
+
+        with self._lock:
+            self.stats["submitted"] += 1
+
+            job = self._inflight.get(key)
+            if job is None or job.cancel_event.is_set():
+                job = GenerationJob(key, prompt, priority, system)
+                self._inflight[key] = job
+                self._queue.put((priority, next(self._seq), job))
+            else:
+                self.stats["deduplicated"] += 1
+                if priority < job.priority and not job.started:
+                    # Re-queue at the higher priority; the stale entry is skipped
+                    job.priority = priority
+                    self._queue.put((priority, next(self._seq), job))
+
+            handle = GenerationHandle(self, job, group)
+            job.handles.add(handle)
+
+            # Supersede the group's previous request only after attaching, so
+            # repeating the same prompt keeps its generation running
+            if group is not None:
+                previous = self._groups.get(group)
+                if previous is not None:
+                    self._detach_locked(previous)
+                self._groups[group] = handle
+
+        return handle
+
+    def generate(self, prompt, priority=PRIORITY_NORMAL, group=None, timeout=None, system=None):
+        """Submit and wait; returns None if superseded or cancelled"""
+        return self.submit(prompt, priority, group, system).result(timeout)
+
+    def cancel(self, handle):
+        with self._lock:
+            self._detach_locked(handle)
+
+    def cancel_group(self, group):
+        """Cancel whatever the group is currently waiting on"""
+        with self._lock:
+            handle = self._groups.get(group)
+            if handle:
+                self._detach_locked(handle)
+
+    def _detach_locked(self, handle):
+        job = handle.job
+        if handle not in job.handles:
+            return
+
+        job.handles.discard(handle)
+        handle.cancelled = True
+        handle._event.set()
+        if self._groups.get(handle.group) is handle:
+            del self._groups[handle.group]
+
+        if not job.handles and not job.cancel_event.is_set():
+            job.cancel_event.set()
+            self.stats["cancelled"] += 1
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            if job.response is not None:
+                # Closing the stream makes Ollama abort the generation
+                try:
+                    job.response.close()
+                except Exception:
+                    pass
+
+    def _worker(self):
+        governor.lower_current_thread()  # Stream parsing must never delay audio
+        while True:
+            _, _, job = self._queue.get()
+
+            with self._lock:
+                if job.started or job.cancel_event.is_set():
+                    continue
+                job.started = True
+
+            metrics.record("llm_queue_wait", time.perf_counter() - job.submitted)
+            with governor.cpu("llm_client"):
+                result = self._generate(job)
+
+            with self._lock:
+                job.result = result
+                if self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+                for handle in job.handles:
+                    handle._event.set()
+                    if self._groups.get(handle.group) is handle:
+                        del self._groups[handle.group]
+                if not job.cancel_event.is_set():
+                    self.stats["generated"] += 1
+
+    def _request(self, job, mode):
+        """Build the endpoint and payload for a prompt mode"""
+        payload = {
+            "model": OLLAMA_MODEL,
+            "stream": True,
+            "keep_alive": OLLAMA_KEEP_ALIVE,  # Keep the model (and its cached prefix) loaded
+            "options": GENERATION_OPTIONS
+        }
+        if OLLAMA_NUM_THREAD:
+            payload["options"] = dict(GENERATION_OPTIONS, num_thread=OLLAMA_NUM_THREAD)
+
+        if mode == "chat":
+            messages = [{"role": "user", "content": job.prompt}]
+            if job.system:
+                messages.insert(0, {"role": "system", "content": job.system})
+            payload["messages"] = messages
+            return "/api/chat", payload
+
+        if mode == "generate" and job.system:
+            payload["system"] = job.system
+            payload["prompt"] = job.prompt
+        else:
+            payload["prompt"] = f"{job.system}\n{job.prompt}" if job.system else job.prompt
+        return "/api/generate", payload
+
+    def _open_stream(self, job):
+        """POST in the current prompt mode, stepping down a mode if the server lacks it
+
+        Missing models are reported as plain errors and never change the mode,
+        so a model that is still being pulled doesn't pin it to "inline".
+        """
+        while True:
+            mode = self.prompt_mode
+            path, payload = self._request(job, mode)
+            response = requests.post(
+                f"{self.base_url}{path}",
+                json=payload,
+                stream=True,
+                timeout=OLLAMA_TIMEOUT
+            )
+
+            unsupported = response.status_code == 404 or (
+                response.status_code == 400 and mode == "generate"
+            )
+            if not unsupported or mode == PROMPT_MODES[-1] or _is_model_error(_error_message(response)):
+                return response, mode
+
+            response.close()
+            fallback = PROMPT_MODES[PROMPT_MODES.index(mode) + 1]
+            print(f"⚠️ Ollama rejected '{mode}' prompts (HTTP {response.status_code}), using '{fallback}'")
+            self.prompt_mode = fallback
+
+    def _generate(self, job):
+        """Stream one generation from Ollama, stopping early if the job is cancelled"""
+        start = time.perf_counter()
+        try:
+            response, mode = self._open_stream(job)
+
+            with self._lock:
+                job.response = response
+                if job.cancel_event.is_set():
+                    response.close()
+                    return None
+
+            if response.status_code != 200:
+                message = _error_message(response)
+                return self._fail(job, f"Ollama error: HTTP {response.status_code}" + (f" ({message})" if message else ""))
+
+            parts = []
+            first_token = True
+            with response:
+                for line in response.iter_lines():
+                    if job.cancel_event.is_set():
+                        return None
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        return self._fail(job, f"Ollama error: {chunk['error']}")
+                    if mode == "chat":
+                        token = chunk.get("message", {}).get("content", "")
+                    else:
+                        token = chunk.get("response", "")
+                    if token and first_token:
+                        metrics.record("llm_ttft", time.perf_counter() - start)
+                        first_token = False
+                    parts.append(token)
+                    if chunk.get("done"):
+                        if "prompt_eval_duration" in chunk:
+                            metrics.record("llm_prefill", chunk["prompt_eval_duration"] / 1e9)
+                        break
+
+            metrics.record("llm_total", time.perf_counter() - start)
+            return "".join(parts) or self._fail(job, "No response generated")
+
+        except Exception as e:
+            if job.cancel_event.is_set():
+                return None
+            if isinstance(e, requests.exceptions.ConnectionError):
+                return self._fail(job, "Cannot connect to Ollama. Please ensure it's running on localhost:11434")
+            return self._fail(job, f"Error calling Ollama: {str(e)[:100]}")
+        finally:
+            job.response = None
+
+    @staticmethod
+    def _fail(job, message):
+        """Mark the job failed; the message is still returned so it can be spoken"""
+        job.failed = True
+        return message
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["queued_or_running"] = len(self._inflight)
+            return stats
@@ -15,24 +15,36 @@ import sounddevice as sd
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from voice_handler import VoiceHandler
-from query_engine import QueryEngine
+from query_engine import LOCAL_SESSION, QueryEngine
 from emergency_detector import EmergencyDetector
 from config import *
+from incident_journal import journal
+from mesh_relay import mesh
+from metrics import metrics
+from resource_governor import governor
+from tts_text import clean_response_for_tts
 
 class CrisisVoiceAssistant:
-    def __init__(self):
+    def __init__(self, voice_handler=None, query_engine=None, emergency_detector=None):
         print("🚁 Initializing Crisis Response Voice Assistant...")
         print("=" * 60)
         
         # Initialize components
         try:
-            self.voice_handler = VoiceHandler()
-            self.query_engine = QueryEngine()
-            self.emergency_detector = EmergencyDetector()
+            # Components can be injected (benchmarks, shared engines in server mode)
+            self.voice_handler = voice_handler or VoiceHandler()
+            self.query_engine = query_engine or QueryEngine()
+            self.emergency_detector = emergency_detector or EmergencyDetector()
             
             self.is_running = False
             self.processing_lock = threading.Lock()
             
+            if METRICS_HTTP_PORT:
+                metrics.start_http_server(METRICS_HTTP_PORT)
+            
+            if MESH_ENABLED:
+                mesh.start()
+            
             print("✅ All components initialized successfully!")
             print("=" * 60)
             
@@ -42,14 +54,24 @@ class CrisisVoiceAssistant:
     
     def process_voice_input(self, text):
         """Process voice input and generate response"""
-        # Prevent overlapping processing
+        # A new utterance supersedes the one still being answered, even if that
+        # one hasn't reached the query engine yet; the newest input always waits its turn
+        generation = self.query_engine.begin_query()
         if not self.processing_lock.acquire(blocking=False):
-            print("⏳ Still processing previous request...")
+            print("🛑 New input received, cancelling previous response...")
+            self.processing_lock.acquire()
+        
+        if self.query_engine.is_superseded(generation):
+            # Even newer input arrived while this one waited; let that one answer
+            self.processing_lock.release()
             return
         
+        pipeline_start = time.perf_counter()
+        journal.record("transcript", session=LOCAL_SESSION, text=text)
         try:
             # Check for emergency/SOS first
-            is_emergency, keyword = self.emergency_detector.detect_sos_in_text(text)
+            with metrics.span("keyword_detection"):
+                is_emergency, keyword = self.emergency_detector.detect_sos_in_text(text)
             
             if is_emergency:
                 # Handle emergency with immediate response
@@ -73,17 +95,11 @@ class CrisisVoiceAssistant:
                 
                 # Get emergency guidance
                 print("📋 Getting emergency guidance...")
-                response = self.query_engine.process_query(text)
-                
-                # Clean the response for better TTS
-                cleaned_response = self._clean_response_for_tts(response)
-                self.voice_handler.speak(cleaned_response)
+                self._answer_query(text, generation)
                 
             else:
                 # Normal query processing
-                response = self.query_engine.process_query(text)
-                cleaned_response = self._clean_response_for_tts(response)
-                self.voice_handler.speak(cleaned_response)
+                self._answer_query(text, generation)
                 
         except Exception as e:
             error_msg = "I encountered an error. Please try again."
@@ -91,33 +107,40 @@ class CrisisVoiceAssistant:
             self.voice_handler.speak(error_msg)
         
         finally:
+            metrics.record("pipeline_total", time.perf_counter() - pipeline_start)
             self.processing_lock.release()
     
-    def _clean_response_for_tts(self, response):
-        """Clean AI response for better TTS"""
-        if not response:
-            return "I couldn't generate a response. Please try again."
+    def _answer_query(self, text, generation=None):
+        """Speak the answer, leading with a quick FAQ/RAG tier when enabled"""
+        if not TIERED_RESPONSES:
+            response = self.query_engine.process_query(text, generation=generation)
+            if response is not None:  # None: superseded by newer input
+                self.voice_handler.speak(self._clean_response_for_tts(response))
+            return
         
-        # Remove excessive formatting
-        cleaned = response.replace('**', '').replace('*', '')
-        cleaned = cleaned.replace('⚠️', 'Warning:').replace('🚨', 'Emergency:')
-        cleaned = cleaned.replace('✅', 'Step:').replace('❌', 'Error:')
+        spoke_quick_answer = False
         
-        # Remove excessive line breaks
-        cleaned = ' '.join(cleaned.split())
+        def speak_quick_answer(partial, tier):
+            nonlocal spoke_quick_answer
+            print(f"⚡ Quick answer ({tier})")
+            self.voice_handler.speak(self._clean_response_for_tts(partial))
+            spoke_quick_answer = True
         
-        # Limit length for TTS
-        # if len(cleaned) > 400:
-        #     sentences = cleaned.split('. ')
-        #     result = ""
-        #     for sentence in sentences:
-        #         if len(result + sentence) < 350:
-        #             result += sentence + ". "
-        #         else:
-        #             break
-        #     cleaned = result + "Ask for more details if needed."
+        response = self.query_engine.process_query(text, on_partial=speak_quick_answer, generation=generation)
+        if response is None:
+            return  # Superseded, or the LLM missed its budget
         
-        return cleaned.strip()
+        if spoke_quick_answer and TIERED_REFINEMENT == "extend":
+            self.voice_handler.wait_for_speech()
+        self.voice_handler.speak(self._clean_response_for_tts(response))
+    
+    def _dispatch_voice_input(self, text):
+        """Process input off the listening thread so new speech can interrupt generation"""
+        threading.Thread(target=self.process_voice_input, args=(text,), daemon=True).start()
+    
+    def _clean_response_for_tts(self, response):
+        """Clean AI response for better TTS"""
+        return clean_response_for_tts(response)
     
     def start(self):
         """Start the voice assistant"""
@@ -135,7 +158,7 @@ class CrisisVoiceAssistant:
             # Start voice listening loop
             while self.is_running:
                 try:
-                    self.voice_handler.listen_for_speech(self.process_voice_input)
+                    self.voice_handler.listen_for_speech(self._dispatch_voice_input)
                     
                     # If listening stopped, wait for restart command
                     if self.is_running:
@@ -212,6 +235,12 @@ class CrisisVoiceAssistant:
         except Exception as e:
             print(f"Cleanup error: {e}")
         
+        metrics.print_summary()
+        governor.print_report()
+        mesh.stop()
+        metrics.close()
+        journal.close()
+        
         print("\n🛑 Crisis Voice Assistant stopped.")
         print("Stay safe! 🚁")
 
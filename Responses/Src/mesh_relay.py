@@ -0,0 +1,279 @@
+"""
+Mesh Relay
+Floods SOS events and generated answers between nearby units over LAN multicast
+
+Every message has a random id and a hop budget. A unit handles each id once,
+then re-broadcasts it with one hop fewer after a short random delay, unless
+it already heard enough other units repeat it. With MESH_KEY set, messages
+carry an HMAC and anything unsigned or forged is dropped. Answers end up
+spoken as advice, so they are only shared when MESH_KEY is set.
+
+Try it on one machine (each command in its own terminal):
+    python mesh_relay.py --interface 127.0.0.1 --node a
+    python mesh_relay.py --interface 127.0.0.1 --node b --sos "trapped under rubble"
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from collections import OrderedDict
+
+from config import *
+from incident_journal import journal
+from resource_governor import governor
+
+_MAGIC = b"CM"
+_VERSION = 1
+_FLAG_SIGNED = 1
+_MAC_BYTES = 16
+_MAX_DATAGRAM = 1400  # Stay under a typical Ethernet/Wi-Fi MTU
+
+
+def encode_message(message, key=None):
+    """Pack a message as magic, version, flags, optional MAC and zlib-compressed JSON"""
+    body = zlib.compress(json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    if key:
+        mac = hmac.new(key.encode("utf-8"), body, hashlib.sha256).digest()[:_MAC_BYTES]
+        return _MAGIC + bytes([_VERSION, _FLAG_SIGNED]) + mac + body
+    return _MAGIC + bytes([_VERSION, 0]) + body
+
+
+def decode_message(data, key=None):
+    """Unpack a datagram; None if it is foreign, malformed or fails authentication"""
+    if len(data) < 4 or data[:2] != _MAGIC or data[2] != _VERSION:
+        return None
+    signed = data[3] & _FLAG_SIGNED
+    body = data[4 + _MAC_BYTES:] if signed else data[4:]
+    if key:
+        if not signed:
+            return None
+        expected = hmac.new(key.encode("utf-8"), body, hashlib.sha256).digest()[:_MAC_BYTES]
+        if not hmac.compare_digest(expected, data[4:4 + _MAC_BYTES]):
+            return None
+    try:
+        return json.loads(zlib.decompress(body).decode("utf-8"))
+    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError):
+        return None
+
+
+class MeshRelay:
+    """One unit's endpoint on the multicast mesh.
+
+    Kinds: "sos" (keyword and a short transcript) and "answer" (a question and
+    the LLM answer for it, so neighbours can serve it from their answer cache).
+    """
+
+    def __init__(self, group=MESH_GROUP, port=MESH_PORT, interface=MESH_INTERFACE,
+                 node_id=MESH_NODE_ID, key=MESH_KEY):
+        self.group = group
+        self.port = port
+        self.interface = interface
+        self.node_id = str(node_id or uuid.uuid4().hex[:8])
+        self.key = str(key) if key else None  # A numeric key from a JSON override is still a secret
+        self.sos_listeners = []
+        self._engines = weakref.WeakSet()
+        self._seen = OrderedDict()  # message id -> copies heard
+        self._answer_times = []
+        self._lock = threading.Lock()
+        self._sock = None
+        self._thread = None
+        self._running = False
+        self.stats = {"sent": 0, "received": 0, "duplicates": 0, "relayed": 0, "suppressed": 0, "rejected": 0}
+
+    # ---- lifecycle -----------------------------------------------------------
+
+    def start(self):
+        if self._running:
+            return self
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)  # Several units per host in tests
+        sock.bind(("", self.port))
+        membership = socket.inet_aton(self.group) + socket.inet_aton(self.interface)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)  # Hops are counted by the relay, not routers
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        sock.settimeout(1.0)
+        self._sock = sock
+        self._running = True
+        self._thread = threading.Thread(target=self._receive_loop, name="mesh-relay", daemon=True)
+        self._thread.start()
+        print(f"📡 Mesh relay {self.node_id} on {self.group}:{self.port} via {self.interface}")
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+
+    # ---- publishing ----------------------------------------------------------
+
+    def publish_sos(self, keyword, text=""):
+        """Tell nearby units about a local emergency"""
+        return self._publish("sos", MESH_SOS_HOPS, {"kw": keyword, "txt": text[:160]})
+
+    def publish_answer(self, query_text, answer, language):
+        """Share an LLM answer; dropped silently without a key or beyond the per-minute budget"""
+        if not self.key or not self._allow_answer():
+            return None
+        return self._publish("answer", MESH_ANSWER_HOPS, {
+            "q": query_text[:200], "a": answer[:MESH_MAX_ANSWER_CHARS], "lang": language
+        })
+
+    def _publish(self, kind, hops, fields):
+        if not self._running:
+            return None
+        message = {"i": uuid.uuid4().hex[:12], "k": kind, "o": self.node_id, "h": hops, "t": round(time.time(), 1)}
+        message.update(fields)
+        with self._lock:
+            self._remember(message["i"])
+        self._send(message)
+        return message["i"]
+
+    def _send(self, message):
+        data = encode_message(message, self.key)
+        if len(data) > _MAX_DATAGRAM:
+            print(f"⚠️ Mesh message {message['i']} too large ({len(data)} bytes), not sent")
+            return
+        try:
+            self._sock.sendto(data, (self.group, self.port))
+            self.stats["sent"] += 1
+        except OSError as e:
+            print(f"⚠️ Mesh send failed: {e}")
+
+    def _allow_answer(self):
+        """Sliding one-minute budget shared by published and relayed answers"""
+        now = time.time()
+        with self._lock:
+            self._answer_times = [t for t in self._answer_times if now - t < 60]
+            if len(self._answer_times) >= MESH_MAX_ANSWERS_PER_MINUTE:
+                return False
+            self._answer_times.append(now)
+            return True
+
+    # ---- receiving and flooding ----------------------------------------------
+
+    def _remember(self, message_id):
+        self._seen[message_id] = 0
+        while len(self._seen) > MESH_SEEN_SIZE:
+            self._seen.popitem(last=False)
+
+    def _receive_loop(self):
+        governor.lower_current_thread()
+        while self._running:
+            try:
+                data, _ = self._sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                self._on_datagram(data)
+            except Exception as e:
+                print(f"⚠️ Mesh message error: {e}")
+
+    def _on_datagram(self, data):
+        message = decode_message(data, self.key)
+        if message is None or "i" not in message:
+            self.stats["rejected"] += 1
+            return
+
+        if message.get("k") == "answer" and not self.key:
+            self.stats["rejected"] += 1  # Unauthenticated advice is never cached or relayed
+            return
+
+        with self._lock:
+            if message["i"] in self._seen:
+                self._seen[message["i"]] += 1
+                self.stats["duplicates"] += 1
+                return
+            self._remember(message["i"])
+
+        if time.time() - message.get("t", 0) > MESH_MAX_AGE:
+            return  # Replayed or long-delayed; don't act on it or spread it
+
+        self.stats["received"] += 1
+        if message.get("k") == "sos":
+            self._on_sos(message)
+        elif message.get("k") == "answer":
+            self._on_answer(message)
+
+        hops = int(message.get("h", 0))
+        if hops > 0 and (message.get("k") != "answer" or self._allow_answer()):
+            relayed = dict(message, h=hops - 1)
+            timer = threading.Timer(random.uniform(0.02, 0.2), self._relay, args=(relayed,))
+            timer.daemon = True
+            timer.start()
+
+    def _relay(self, message):
+        """Re-broadcast unless enough neighbours already did (counter-based suppression)"""
+        with self._lock:
+            copies = self._seen.get(message["i"], 0)
+        if copies >= MESH_SUPPRESS_COPIES:
+            self.stats["suppressed"] += 1
+            return
+        if self._running:
+            self._send(message)
+            self.stats["relayed"] += 1
+
+    def _on_sos(self, message):
+        print(f"📡 SOS relayed from unit {message.get('o')}: {message.get('kw')} - {message.get('txt', '')}")
+        journal.record("mesh_sos", origin=message.get("o"), id=message["i"],
+                       keyword=message.get("kw"), text=message.get("txt"))
+        for listener in list(self.sos_listeners):
+            try:
+                listener(message)
+            except Exception as e:
+                print(f"⚠️ Mesh SOS listener error: {e}")
+
+    def _on_answer(self, message):
+        for engine in list(self._engines):
+            if engine.answer_language() == message.get("lang"):
+                engine.add_shared_answer(message.get("q", ""), message.get("a", ""), message.get("o"))
+
+    def register_engine(self, engine):
+        """Feed answers in the engine's language into its answer cache"""
+        self._engines.add(engine)
+
+    def get_stats(self):
+        return dict(self.stats, node=self.node_id, seen=len(self._seen))
+
+
+# Shared relay used by all components; started only when MESH_ENABLED
+mesh = MeshRelay()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Join the mesh and print what arrives")
+    parser.add_argument("--interface", default=MESH_INTERFACE)
+    parser.add_argument("--node", default=None)
+    parser.add_argument("--sos", help="publish this SOS text once joined")
+    args = parser.parse_args()
+
+    relay = MeshRelay(interface=args.interface, node_id=args.node).start()
+    if args.sos:
+        relay.publish_sos("sos", args.sos)
+    try:
+        while True:
+            time.sleep(5)
+            print(f"📊 {relay.get_stats()}")
+    except KeyboardInterrupt:
+        relay.stop()
+
+
+if __name__ == "__main__":
+    main()
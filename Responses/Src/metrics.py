@@ -0,0 +1,142 @@
+"""
+Pipeline Metrics
+Per-stage timing spans, rolling histograms and a local metrics surface
+"""
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import *
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class RollingHistogram:
+    """Keeps the most recent samples of one stage for percentile queries"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        values = sorted(self.samples)
+        return {
+            "count": self.count,
+            "window": len(values),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2) if values else 0.0
+        }
+
+
+class MetricsRegistry:
+    """Collects stage timings in memory and optionally appends them to a JSONL log"""
+
+    def __init__(self, enabled=METRICS_ENABLED, window=METRICS_WINDOW, log_path=METRICS_LOG_PATH):
+        self.enabled = enabled
+        self.window = window
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._log_file = open(log_path, 'a', buffering=1) if (enabled and log_path) else None
+        self._server = None
+
+    def record(self, stage, seconds, **fields):
+        """Record one duration for a stage"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = RollingHistogram(self.window)
+            histogram.add(seconds)
+
+            if self._log_file:
+                entry = {"ts": round(time.time(), 3), "stage": stage, "ms": round(seconds * 1000, 2)}
+                entry.update(fields)
+                self._log_file.write(json.dumps(entry) + "\n")
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """Time the enclosed block as one sample of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, **fields)
+
+    def snapshot(self):
+        """Summaries for every stage seen so far"""
+        with self._lock:
+            return {stage: h.summary() for stage, h in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+
+    def print_summary(self):
+        """Print a compact per-stage table"""
+        stats = self.snapshot()
+        if not stats:
+            return
+        print("📊 Stage latency (ms):")
+        for stage, s in stats.items():
+            print(f"   {stage:<20} n={s['count']:<5} p50={s['p50_ms']:<9} p95={s['p95_ms']:<9} max={s['max_ms']}")
+
+    def start_http_server(self, port=METRICS_HTTP_PORT, host="127.0.0.1"):
+        """Serve the snapshot as JSON on http://host:port/metrics"""
+        if self._server or not port:
+            return None
+
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("/metrics", ""):
+                    self.send_error(404)
+                    return
+                body = json.dumps(registry.snapshot()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep request logs off the console
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📊 Metrics available at http://{host}:{port}/metrics")
+        return self._server
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server = None
+        if self._log_file:
+            self._log_file.close()
+            self._log_file = None
+
+
+# Shared registry used by all components
+metrics = MetricsRegistry()
@@ -0,0 +1,198 @@
+"""
+Mock Ollama Server
+Local stub of the Ollama HTTP API for benchmarks and offline development
+
+Usage:
+    python mock_ollama.py --port 11435 --first-token-delay 0.5 --token-delay 0.02
+
+With --prefill-ms-per-token the first token is further delayed by the number of
+uncached prompt words. Like Ollama's KV cache, the longest common prefix with
+the previous request's rendered prompt (system text, then prompt) is cached,
+whether the system text came as a chat message, the "system" field or inline.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = (
+    "1. Make sure the area is safe. "
+    "2. Check if the person is breathing. "
+    "3. Apply firm pressure to any bleeding. "
+    "4. Keep the person warm and still. "
+    "5. Call 112 as soon as you can."
+)
+
+
+class MockOllamaServer:
+    """Imitates /api/generate and /api/chat (streaming and non-streaming) with configurable delays"""
+
+    def __init__(self, host="127.0.0.1", port=0, response_text=DEFAULT_RESPONSE,
+                 first_token_delay=0.2, token_delay=0.01, model="gemma3n:latest",
+                 prefill_per_token=0.0, supports_chat=True):
+        self.response_text = response_text
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.model = model
+        self.prefill_per_token = prefill_per_token
+        self.supports_chat = supports_chat
+        self._cached_words = []
+        self.request_count = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def tokens(self):
+        """Split the canned response into word-sized stream chunks"""
+        words = self.response_text.split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+    def prefill(self, system, prompt):
+        """Delay and token count for the part of the prompt not already cached"""
+        words = (f"{system}\n{prompt}" if system else prompt).split()
+        with self._lock:
+            cached = 0
+            for new, old in zip(words, self._cached_words):
+                if new != old:
+                    break
+                cached += 1
+            self._cached_words = words
+        tokens = len(words) - cached
+        return tokens * self.prefill_per_token, tokens
+
+    def _make_handler(self):
+        mock = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _write_chunk(self, payload):
+                data = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": [{"name": mock.model}]})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                chat = self.path == "/api/chat"
+                if self.path != "/api/generate" and not (chat and mock.supports_chat):
+                    self.send_error(404)
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                with mock._lock:
+                    mock.request_count += 1
+                    mock.requests.append(request)
+
+                if chat:
+                    messages = request.get("messages", [])
+                    system = "".join(m["content"] for m in messages if m.get("role") == "system")
+                    prompt = "".join(m["content"] for m in messages if m.get("role") != "system")
+                else:
+                    system = request.get("system", "")
+                    prompt = request.get("prompt", "")
+
+                started = time.perf_counter()
+                prefill_delay, prefill_tokens = mock.prefill(system, prompt)
+                time.sleep(mock.first_token_delay + prefill_delay)
+                prefill_seconds = time.perf_counter() - started
+
+                def chunk(text, done):
+                    payload = {"model": mock.model, "done": done}
+                    if chat:
+                        payload["message"] = {"role": "assistant", "content": text}
+                    else:
+                        payload["response"] = text
+                    if done:
+                        payload.update({
+                            "total_duration": int((time.perf_counter() - started) * 1e9),
+                            "prompt_eval_count": prefill_tokens,
+                            "prompt_eval_duration": int(prefill_seconds * 1e9),
+                            "eval_count": len(mock.tokens())
+                        })
+                    return payload
+
+                if not request.get("stream", True):
+                    time.sleep(mock.token_delay * len(mock.tokens()))
+                    self._send_json(chunk(mock.response_text, True))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                try:
+                    for i, token in enumerate(mock.tokens()):
+                        if i:
+                            time.sleep(mock.token_delay)
+                        self._write_chunk(chunk(token, False))
+                    self._write_chunk(chunk("", True))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client closed the stream early
+
+            def log_message(self, format, *args):
+                pass
+
+        return _Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.0)
+    parser.add_argument("--no-chat", action="store_true", help="answer /api/chat with 404")
+    args = parser.parse_args()
+
+    server = MockOllamaServer(
+        args.host, args.port,
+        first_token_delay=args.first_token_delay,
+        token_delay=args.token_delay,
+        prefill_per_token=args.prefill_ms_per_token / 1000.0,
+        supports_chat=not args.no_chat
+    ).start()
+    print(f"🧪 Mock Ollama listening on {server.base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,262 @@
 import faiss
 import numpy as np
 import json
-import requests
-from sentence_transformers import SentenceTransformer
+import math
+import os
+import re
+import threading
+import time
 from sklearn.metrics.pairwise import cosine_similarity
 from config import *
+from conversation_memory import ConversationStore, blend_with_history, is_follow_up
+from embedding_cache import EmbeddingCache, SemanticAnswerCache, load_corpus_embeddings, normalize_query
+from encoder import load_encoder
+from hot_reload import knowledge_watcher
+from incident_journal import journal
+from index_shards import (
+    MANIFEST_NAME, build_shards, convert_shards, load_shards, make_index, route_categories, search_shards
+)
+from llm_scheduler import LLMScheduler, PRIORITY_HIGH, PRIORITY_NORMAL
+from mesh_relay import mesh
+from metrics import metrics
+from resource_governor import governor
+
+# Scheduler group used by the single-user voice loop
+LOCAL_SESSION = "local"
+
+# Static instructions shared by every prompt; sent as the system prompt so the
+# server can keep its prefill cached between requests
+CRISIS_SYSTEM_PROMPT = """You are CRISIS-AI, an offline emergency assistant. Respond in 50-150 words with 3-6 numbered steps.
+
+RULES:
+- Start with most life-threatening issue first
+- Use simple, clear language for audio output
+- Give actionable steps only
+- No disclaimers or long explanations"""
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "can", "do", "for", "from", "had", "has", "have",
+    "how", "i", "if", "in", "is", "it", "its", "me", "my", "of", "on", "or", "our", "should",
+    "so", "that", "the", "their", "there", "this", "to", "was", "we", "what", "when", "where",
+    "which", "who", "why", "will", "with", "you", "your"
+}
+
+
+def _content_words(text):
+    return {w for w in re.findall(r"[a-z']+", text.lower()) if w not in _STOPWORDS and len(w) > 2}
+
+
+def extract_summary(query_text, passage, max_sentences=3, max_words=60):
+    """Pick the passage sentences that best overlap the query, kept in reading order"""
+    query_words = _content_words(query_text)
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", passage) if len(s.split()) >= 4]
+    if not query_words or not sentences:
+        return None
+    
+    scored = []
+    for position, sentence in enumerate(sentences):
+        words = _content_words(sentence)
+        overlap = len(query_words & words)
+        if overlap:
+            scored.append((overlap / math.sqrt(len(words)), position))
+    if not scored:
+        return None
+    
+    chosen = sorted(position for _, position in sorted(scored, reverse=True)[:max_sentences])
+    words = " ".join(sentences[i] for i in chosen).split()
+    summary = " ".join(words[:max_words])
+    if len(words) > max_words:
+        summary += "..."
+    return summary
+
+class RagStore:
+    """FAISS index, chunk texts and derived vectors that are always swapped together"""
+    
+    def __init__(self, index=None, texts=None, metadata=None, corpus_embeddings=None, shards=None):
+        self.index = index
+        self.texts = texts or []
+        self.metadata = metadata or []
+        self.corpus_embeddings = corpus_embeddings
+        self.shards = shards
 
 class QueryEngine:
-    def __init__(self):
+    def __init__(self, faiss_index_path=FAISS_INDEX_PATH, metadata_path=METADATA_PATH,
+                 faq_path=FAQ_PATH, embeddings_path=EMBEDDINGS_PATH, encoder=None,
+                 scheduler=None, language_name=None, shards_dir=SHARDS_PATH):
         print("🧠 Initializing Query Engine...")
+        self.scheduler = scheduler or LLMScheduler(OLLAMA_BASE_URL)
+        self.language_name = language_name  # Answer language if not English
+        self._query_generations = {}  # session -> counter bumped by each new query
+        self._generations_lock = threading.Lock()
+        self.memory = ConversationStore() if MEMORY_ENABLED else None
+        
+        self.faiss_index_path = faiss_index_path
+        self.metadata_path = metadata_path
+        self.faq_path = faq_path
+        self.embeddings_path = embeddings_path
+        self.shards_dir = shards_dir
         
-        # Load sentence transformer
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+        # Load sentence encoder (PyTorch or ONNX, see ENCODER_BACKEND)
+        if encoder is None:
+            with governor.loading("encoder"):
+                encoder = load_encoder()
+        self.model = encoder
+        self.query_cache = EmbeddingCache(self.model.encode, max_size=QUERY_EMBEDDING_CACHE_SIZE)
+        self.answer_cache = None
+        if ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_MIN_SIMILARITY)
         
-        # Load FAISS index and metadata
+        # Knowledge base files; replaced as a whole when they change on disk
+        with governor.loading("rag"):
+            self.rag = self._load_rag()
+        self.emergency_faqs = self._load_faqs()
+        
+        # Torch and faiss are loaded by now, so their pools can be capped
+        governor.apply_thread_limits()
+        
+        if HOT_RELOAD_ENABLED:
+            knowledge_watcher.watch(self)
+        if MESH_ENABLED:
+            mesh.register_engine(self)
+    
+    def _load_rag(self, strict=False):
+        """Load the FAISS index, metadata, corpus vectors and shards as one snapshot
+        
+        With strict, a missing or inconsistent file raises instead of giving an
+        empty store, so a hot reload keeps the data already in use.
+        """
         try:
-            self.index = faiss.read_index(FAISS_INDEX_PATH)
-            with open(METADATA_PATH, 'r') as f:
+            index = faiss.read_index(self.faiss_index_path)
+            with open(self.metadata_path, 'r') as f:
                 data = json.load(f)
-            self.texts = data["texts"]
-            self.metadata = data["meta"]
-            print(f"✅ RAG loaded: {len(self.texts)} documents")
+            texts = data["texts"]
+            metadata = data["meta"]
+            if index.ntotal != len(texts):
+                message = f"index has {index.ntotal} vectors but metadata has {len(texts)} chunks"
+                if strict:
+                    raise ValueError(message)
+                print(f"⚠️ {message}")
+            print(f"✅ RAG loaded: {len(texts)} documents")
         except Exception as e:
+            if strict:
+                raise
             print(f"❌ Error loading RAG data: {e}")
-            self.index = None
-            self.texts = []
-            self.metadata = []
+            return RagStore()
+        
+        # Corpus vectors, memory-mapped so scoring never re-encodes chunk text
+        corpus_embeddings = None
+        try:
+            corpus_embeddings = load_corpus_embeddings(
+                self.embeddings_path, index, texts, self.model.encode, source_path=self.faiss_index_path
+            )
+        except Exception as e:
+            print(f"⚠️ Could not prepare corpus embeddings: {e}")
+        
+        # Low-power profile: swap the exact index for a quantized copy
+        if INDEX_TYPE != "flat" and corpus_embeddings is not None:
+            try:
+                index = make_index(corpus_embeddings, index.metric_type, INDEX_TYPE)
+                print(f"✅ Index converted to {INDEX_TYPE}")
+            except Exception as e:
+                print(f"⚠️ Could not convert index to {INDEX_TYPE}, keeping it exact: {e}")
         
-        # Load emergency FAQ
+        # Per-category shards; built in memory from the corpus vectors if not on disk
+        shards = None
+        if SHARDS_ENABLED:
+            try:
+                shards = load_shards(self.shards_dir, index.ntotal, source_path=self.faiss_index_path)
+                if shards is not None:
+                    shards = convert_shards(shards, INDEX_TYPE)  # Shards on disk are always exact
+                elif corpus_embeddings is not None:
+                    shards = build_shards(corpus_embeddings, metadata, index.metric_type, INDEX_TYPE)
+                if shards:
+                    sizes = ", ".join(f"{c}: {s.index.ntotal}" for c, s in sorted(shards.items()))
+                    print(f"✅ Index shards ready ({sizes})")
+            except Exception as e:
+                print(f"⚠️ Could not prepare index shards, searching the full index: {e}")
+                shards = None
+        
+        return RagStore(index, texts, metadata, corpus_embeddings, shards)
+    
+    def _load_faqs(self, strict=False):
+        """Load the emergency FAQ entries"""
         try:
-            with open(FAQ_PATH, 'r') as f:
+            with open(self.faq_path, 'r', encoding='utf-8') as f:
                 faq_data = json.load(f)
-            self.emergency_faqs = faq_data["faqs"]
-            print(f"✅ Emergency FAQ loaded: {len(self.emergency_faqs)} entries")
+            faqs = faq_data["faqs"]
+            for faq in faqs:
+                if not isinstance(faq.get("keywords"), list) or "response" not in faq:
+                    raise ValueError("every FAQ entry needs 'keywords' and 'response'")
+            print(f"✅ Emergency FAQ loaded: {len(faqs)} entries")
+            return faqs
         except Exception as e:
+            if strict:
+                raise
             print(f"⚠️ Could not load emergency FAQ: {e}")
-            self.emergency_faqs = []
+            return []
+    
+    def watched_files(self):
+        """Files behind each reloadable part of the knowledge base"""
+        return {
+            "faq": [self.faq_path],
+            "rag": [self.faiss_index_path, self.metadata_path, os.path.join(self.shards_dir, MANIFEST_NAME)]
+        }
+    
+    def reload(self, group):
+        """Load fresh files off the query path, then swap them in with one assignment
+        
+        Queries already running keep the snapshot they started with. The encoder,
+        the query cache and conversation memory are kept as they are; cached
+        answers are dropped, since they were built on the old knowledge base.
+        """
+        with metrics.span("kb_reload"):
+            if group == "faq":
+                self.emergency_faqs = self._load_faqs(strict=True)
+            elif group == "rag":
+                self.rag = self._load_rag(strict=True)
+            if self.answer_cache is not None:
+                self.answer_cache.clear()
+        journal.record("kb_reload", files=group, language=self.language_name)
+    
+    def answer_language(self):
+        """Language of this engine's answers, used to match answers shared over the mesh"""
+        return self.language_name or LANGUAGES[DEFAULT_LANGUAGE]["name"]
+    
+    def add_shared_answer(self, query_text, answer, origin):
+        """Cache an answer a nearby unit generated (called from the mesh thread)"""
+        if self.answer_cache is None or not query_text or not answer:
+            return
+        query_vec = self.model.encode([normalize_query(query_text)])
+        self.answer_cache.add(query_text, query_vec, answer, source=origin)
+    
+    def _share_answer(self, query_text, response, history):
+        """Cache a fresh LLM answer and offer it to nearby units"""
+        # Prompts with history are tied to that conversation, so their answers aren't reusable
+        if not response or history or self.answer_cache is None:
+            return
+        self.answer_cache.add(query_text, self.query_cache.get(query_text), response)
+        if MESH_ENABLED:
+            mesh.publish_answer(query_text, response, self.answer_language())
+    
+    @property
+    def index(self):
+        return self.rag.index
+    
+    @property
+    def texts(self):
+        return self.rag.texts
+    
+    @property
+    def metadata(self):
+        return self.rag.metadata
+    
+    @property
+    def corpus_embeddings(self):
+        return self.rag.corpus_embeddings
+    
+    @property
+    def shards(self):
+        return self.rag.shards
     
     def search_emergency_faq(self, query_text):
         """Search predefined emergency FAQ first"""
@@ -59,27 +280,36 @@ class QueryEngine:
         
         return best_match
     
-    def search_rag_database(self, query_text, top_k=3, confidence_threshold=0.65):
-        """Search RAG database using vector similarity"""
-        if not self.index or not self.texts:
+    def search_rag_database(self, query_text, top_k=3, confidence_threshold=0.65, history_vec=None,
+                            categories=None):
+        """Search RAG database using vector similarity
+        
+        history_vec, the embedding of the previous turn, is blended into the
+        query so follow-ups like "what next?" retrieve on the ongoing topic.
+        
+        categories restricts the search to those index shards; if they hold no
+        confident match the full index is searched, so routing never loses recall.
+        """
+        rag = self.rag  # One consistent snapshot even if a reload swaps it meanwhile
+        if not rag.index or not rag.texts:
             return None, 0.0
         
         try:
-            query_vec = self.model.encode([query_text])
-            D, I = self.index.search(np.array(query_vec), top_k)
+            with metrics.span("embedding"), governor.cpu("embedding"):
+                query_vec = self.query_cache.get(query_text)
+                if history_vec is not None:
+                    query_vec = blend_with_history(query_vec, history_vec)
             
-            if I[0][0] == -1:  # No results
-                return None, 0.0
-            
-            # Get best match and calculate cosine similarity
-            best_idx = I[0][0]
-            best_text = self.texts[best_idx]
+            categories = categories if rag.shards else None
+            best_idx, similarity = self._best_match(rag, query_vec, top_k, categories)
+            if categories and similarity <= confidence_threshold:
+                best_idx, similarity = self._best_match(rag, query_vec, top_k)
             
-            text_vec = self.model.encode([best_text])
-            similarity = cosine_similarity(query_vec, text_vec)[0][0]
+            if best_idx is None:  # No results
+                return None, 0.0
             
             if similarity > confidence_threshold:
-                return best_text, similarity
+                return rag.texts[best_idx], similarity
             
             return None, similarity
             
@@ -87,34 +317,79 @@ class QueryEngine:
             print(f"❌ RAG search error: {e}")
             return None, 0.0
     
-    def call_ollama(self, prompt):
-        """Call local Ollama Gemma model"""
-        try:
-            response = requests.post(
-                f"{OLLAMA_BASE_URL}/api/generate",
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,
-                        "top_p": 0.8,
-                        "num_predict": 200
-                    }
-                },
-                timeout=100
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("response", "No response generated")
-            else:
-                return f"Ollama error: HTTP {response.status_code}"
-                
-        except requests.exceptions.ConnectionError:
-            return "Cannot connect to Ollama. Please ensure it's running on localhost:11434"
-        except Exception as e:
-            return f"Error calling Ollama: {str(e)[:100]}"
+    def _best_match(self, rag, query_vec, top_k, categories=None):
+        """Top hit from the given shards (or the full index) and its cosine similarity"""
+        with metrics.span("faiss_search"), governor.cpu("faiss"):
+            D, I = search_shards(rag.shards, categories, query_vec, top_k) if categories else (None, None)
+            if I is None:
+                D, I = rag.index.search(query_vec, top_k)
+        
+        if I[0][0] == -1:
+            return None, 0.0
+        
+        # Get best match and calculate cosine similarity
+        best_idx = int(I[0][0])
+        if rag.corpus_embeddings is not None:
+            text_vec = np.asarray(rag.corpus_embeddings[best_idx:best_idx + 1], dtype=np.float32)
+        else:
+            text_vec = self.model.encode([rag.texts[best_idx]])
+        return best_idx, cosine_similarity(query_vec, text_vec)[0][0]
+    
+    def call_ollama(self, prompt, priority=PRIORITY_NORMAL, session_id=None, timeout=None):
+        """Call local Ollama Gemma model through the scheduler.
+        
+        Returns None when a newer request from the same session superseded this one,
+        or when the answer missed the timeout (the generation is then cancelled).
+        """
+        return self._call_ollama(prompt, priority, session_id, timeout)[0]
+    
+    def _call_ollama(self, prompt, priority=PRIORITY_NORMAL, session_id=None, timeout=None):
+        """call_ollama, plus whether the text is a real answer rather than an error message"""
+        handle = self.scheduler.submit(
+            prompt, priority=priority, group=session_id or LOCAL_SESSION, system=CRISIS_SYSTEM_PROMPT
+        )
+        result = handle.result(timeout)
+        if not handle.done():
+            print(f"⏱️ LLM missed its {timeout:.1f}s budget, keeping the quick answer")
+            handle.cancel()
+        return result, handle.succeeded()
+    
+    def cancel_generation(self, session_id=None):
+        """Stop the in-flight generation for a session (e.g. the user interrupted)"""
+        self.begin_query(session_id)
+    
+    def begin_query(self, session_id=None):
+        """Supersede the session's current query and return the token for the next one
+        
+        Take the token as soon as an utterance is accepted and pass it to
+        process_query, so a query that has not reached the engine yet still
+        sees that it was superseded.
+        """
+        group = session_id or LOCAL_SESSION
+        generation = self._next_generation(group)
+        self.scheduler.cancel_group(group)
+        return generation
+    
+    def is_superseded(self, generation, session_id=None):
+        return self._is_superseded(session_id or LOCAL_SESSION, generation)
+    
+    def _next_generation(self, group):
+        with self._generations_lock:
+            generation = self._query_generations.get(group, 0) + 1
+            self._query_generations[group] = generation
+            return generation
+    
+    def _is_superseded(self, group, generation):
+        with self._generations_lock:
+            return self._query_generations.get(group) != generation
+    
+    @property
+    def ollama_url(self):
+        return self.scheduler.base_url
+    
+    @ollama_url.setter
+    def ollama_url(self, url):
+        self.scheduler.base_url = url
     
     def analyze_crisis_urgency(self, query_text):
         """Analyze urgency level of the crisis"""
@@ -136,54 +411,166 @@ class QueryEngine:
         
         return urgency_level
     
-    def process_query(self, query_text):
-        """Main query processing pipeline"""
+    def process_query(self, query_text, session_id=None, on_partial=None, generation=None):
+        """Main query processing pipeline
+        
+        With on_partial, answers are tiered: a FAQ answer or an extract of the best
+        RAG passage is passed to on_partial(text, tier) right away, and the return
+        value is the LLM answer if it arrives within the urgency's latency budget.
+        
+        Returns None when there is nothing (more) to say: the LLM answer was
+        cancelled by a newer query, or it missed the budget in tiered mode.
+        
+        generation is the token from begin_query, taken when the input was
+        accepted; without one the query supersedes the session's earlier ones now.
+        """
+        group = session_id or LOCAL_SESSION
+        if generation is None:
+            generation = self.begin_query(session_id)
+        memory = self.memory.get(group) if self.memory else None
+        delivered = []
+        
+        def deliver_partial(text, tier):
+            delivered.append(text)
+            journal.record("answer", session=group, tier=tier, text=text)
+            on_partial(text, tier)
+        
+        with metrics.span("query_total"):
+            response = self._process_query(
+                query_text, session_id, deliver_partial if on_partial else None, memory, generation
+            )
+        
+        if response:
+            journal.record("answer", session=group, tier="llm", text=response)
+        
+        # Remember what the user actually heard, with the query vector if one was computed
+        answer = response or (delivered[-1] if delivered else None)
+        if memory is not None and answer:
+            memory.add_turn(query_text, answer, self.query_cache.peek(query_text))
+        
+        return response
+    
+    def _process_query(self, query_text, session_id, on_partial, memory, generation):
+        start = time.perf_counter()
+        group = session_id or LOCAL_SESSION
+        
+        # Each stage below is skipped once a newer query or a cancel arrived
+        if self._is_superseded(group, generation):
+            return None
         print(f"🔍 Processing: {query_text}")
         
+        history = ""
+        history_vec = None
+        routing_text = query_text
+        if memory is not None and not memory.is_empty():
+            history = memory.format_history()
+            last_turn = memory.last_turn()
+            if is_follow_up(query_text):
+                if last_turn.embedding is None:
+                    last_turn.embedding = self.query_cache.get(last_turn.user_text)
+                history_vec = last_turn.embedding
+                routing_text = f"{last_turn.user_text} {query_text}"
+        
         # Step 1: Check Emergency FAQ first
-        faq_match = self.search_emergency_faq(query_text)
+        with metrics.span("faq_lookup"):
+            faq_match = self.search_emergency_faq(query_text)
         if faq_match:
             print("✅ Found in Emergency FAQ")
+            if on_partial:
+                # Curated answers are final; no LLM refinement needed
+                metrics.record("quick_answer", time.perf_counter() - start)
+                on_partial(faq_match["response"], "faq")
+                return None
             return faq_match["response"]
         
-        # Step 2: Search RAG database
-        rag_result, similarity = self.search_rag_database(query_text)
+        if self._is_superseded(group, generation):
+            return None
+        
+        # Step 2: Reuse an answer generated here or by a nearby unit for the same question
+        if self.answer_cache is not None and history_vec is None:
+            with metrics.span("answer_cache_lookup"):
+                cached = self.answer_cache.lookup(self.query_cache.get(query_text))
+            if cached:
+                answer, similarity, source = cached
+                print(f"✅ Found in answer cache (similarity: {similarity:.2f}, from {source})")
+                if on_partial:
+                    metrics.record("quick_answer", time.perf_counter() - start)
+                    on_partial(answer, "cache")
+                    return None
+                return answer
+        
+        urgency = self.analyze_crisis_urgency(query_text)
+        priority = PRIORITY_HIGH if urgency == "high" else PRIORITY_NORMAL
+        
+        if self._is_superseded(group, generation):
+            return None
+        
+        # Step 3: Search RAG database, only in the shards the query is about
+        categories = route_categories(routing_text, urgency)
+        with metrics.span("rag_lookup"):
+            rag_result, similarity = self.search_rag_database(
+                query_text, history_vec=history_vec, categories=categories
+            )
+        
+        if self._is_superseded(group, generation):
+            return None
+        
         if rag_result:
             print(f"✅ Found in RAG database (similarity: {similarity:.2f})")
+            
+            timeout = None
+            if on_partial:
+                summary = extract_summary(query_text, rag_result)
+                if summary:
+                    metrics.record("quick_answer", time.perf_counter() - start)
+                    on_partial(summary, "extract")
+                    budget = LLM_LATENCY_BUDGETS.get(urgency, LLM_LATENCY_BUDGETS["low"])
+                    timeout = max(0.0, budget - (time.perf_counter() - start))
+            
             # Use RAG result as context for Ollama
-            prompt = self.create_crisis_prompt(query_text, rag_result)
-            return self.call_ollama(prompt)
+            prompt = self.create_crisis_prompt(query_text, rag_result, history)
+            response, ok = self._call_ollama(prompt, priority, session_id, timeout)
+            if self._is_superseded(group, generation):
+                return None
+            if ok:
+                self._share_answer(query_text, response, history)
+            return response
         
-        # Step 3: Fallback to Ollama with general crisis prompt
+        # Step 4: Fallback to Ollama with general crisis prompt
         print("⚠️ No specific match found, using AI response")
-        prompt = self.create_crisis_prompt(query_text, "")
-        return self.call_ollama(prompt)
+        prompt = self.create_crisis_prompt(query_text, "", history)
+        response, ok = self._call_ollama(prompt, priority, session_id)
+        if self._is_superseded(group, generation):
+            return None
+        if ok:
+            self._share_answer(query_text, response, history)
+        return response
     
-    def create_crisis_prompt(self, query_text, context=""):
-        """Create optimized prompt for crisis situations"""
+    def create_crisis_prompt(self, query_text, context="", history=""):
+        """Create the per-query part of the prompt (CRISIS_SYSTEM_PROMPT is sent separately)"""
         urgency = self.analyze_crisis_urgency(query_text)
         
-        base_prompt = """You are CRISIS-AI, an offline emergency assistant. Respond in 50-150 words with 3-6 numbered steps.
-
-RULES:
-- Start with most life-threatening issue first
-- Use simple, clear language for audio output
-- Give actionable steps only
-- No disclaimers or long explanations"""
-
         if urgency == "high":
-            urgency_text = "\n🚨 HIGH URGENCY - Person may be in immediate danger!"
+            urgency_text = "🚨 HIGH URGENCY - Person may be in immediate danger!"
         else:
-            urgency_text = "\n⚠️ Provide practical safety steps."
+            urgency_text = "⚠️ Provide practical safety steps."
         
         context_text = ""
         if context and context.strip():
             context_text = f"\n\nRELEVANT INFO:\n{context}\n"
         
-        final_prompt = f"""{base_prompt}{urgency_text}{context_text}
+        history_text = ""
+        if history:
+            history_text = f"\n\nCONVERSATION SO FAR:\n{history}\n"
+        
+        language_text = ""
+        if self.language_name and self.language_name != "English":
+            language_text = f" Respond in {self.language_name}."
+        
+        final_prompt = f"""{urgency_text}{context_text}{history_text}
 
 USER EMERGENCY: {query_text}
 
-Respond with numbered steps:"""
+Respond with numbered steps:{language_text}"""
         
-        return final_prompt
\ No newline at end of file
+        return final_prompt
@@ -0,0 +1,220 @@
+"""
+Resource Governor
+Thread caps for the numeric libraries, audio thread priority and per-component RSS/CPU
+
+Usage:
+    python resource_governor.py    # print thread limits and current usage
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from config import *
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def thread_limit(library):
+    """Configured intra-op thread count for a library, or None for its default"""
+    return (THREAD_LIMITS or {}).get(library) or None
+
+
+def _set_thread_priority(raise_priority):
+    """Change the calling thread's scheduling priority; False if not permitted"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+
+            kernel32 = ctypes.windll.kernel32
+            level = 2 if raise_priority else -1  # THREAD_PRIORITY_HIGHEST / BELOW_NORMAL
+            return bool(kernel32.SetThreadPriority(kernel32.GetCurrentThread(), level))
+
+        if sys.platform.startswith("linux"):
+            # On Linux a native thread id addresses just that thread; threads
+            # it starts later inherit the value, so only leaf threads are raised
+            nice = -THREAD_NICE_STEP if raise_priority else THREAD_NICE_STEP
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), max(-20, min(19, nice)))
+            return True
+    except (OSError, AttributeError):
+        pass
+    return False  # Other platforms only expose process-wide priority
+
+
+def _rss_mb(process=None):
+    if process is not None:
+        return process.memory_info().rss / 2 ** 20
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ComponentUsage:
+    def __init__(self):
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.calls = 0
+        self.load_rss_mb = 0.0
+
+
+class ResourceGovernor:
+    """Applies thread caps and priorities, and attributes CPU and memory to components.
+
+    CPU is the calling thread's own time (time.thread_time) inside a cpu()
+    block, so it is exact for single-threaded work; threads a library spawns
+    internally only show up in the process total. Memory is the RSS growth
+    while a component loads, which is what differs between model choices.
+    """
+
+    def __init__(self):
+        self.usage = {}
+        self.limits_applied = {}
+        self._lock = threading.Lock()
+        self._process = psutil.Process() if psutil else None
+        self._warned_priority = False
+
+    # ---- thread pools --------------------------------------------------------
+
+    def apply_thread_limits(self):
+        """Cap the pools of already-imported libraries; env vars cover the rest"""
+        blas = thread_limit("blas")
+        if blas:
+            for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+                os.environ.setdefault(var, str(blas))
+            try:
+                from threadpoolctl import threadpool_limits
+
+                threadpool_limits(limits=blas, user_api="blas")
+                self.limits_applied["blas"] = blas
+            except Exception as e:
+                print(f"⚠️ Could not cap BLAS threads: {e}")
+
+        faiss_threads = thread_limit("faiss")
+        if faiss_threads and "faiss" in sys.modules:
+            sys.modules["faiss"].omp_set_num_threads(faiss_threads)
+            self.limits_applied["faiss"] = faiss_threads
+
+        torch_threads = thread_limit("torch")
+        if torch_threads and "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(torch_threads)
+            self.limits_applied["torch"] = torch_threads
+
+        return self.limits_applied
+
+    # ---- priorities ----------------------------------------------------------
+
+    def raise_current_thread(self):
+        """Give the audio path priority over model work (best effort)"""
+        if not AUDIO_THREAD_PRIORITY:
+            return False
+        raised = _set_thread_priority(True)
+        if not raised and not self._warned_priority:
+            self._warned_priority = True
+            print("⚠️ Cannot raise audio thread priority here; lowering background threads only")
+        return raised
+
+    def lower_current_thread(self):
+        """Let a background thread yield the CPU to audio and TTS"""
+        return _set_thread_priority(False)
+
+    # ---- accounting ----------------------------------------------------------
+
+    def _component(self, name):
+        usage = self.usage.get(name)
+        if usage is None:
+            usage = self.usage[name] = ComponentUsage()
+        return usage
+
+    @contextmanager
+    def cpu(self, component):
+        """Attribute the enclosed block's thread CPU time to a component"""
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cpu = time.thread_time() - cpu_start
+            wall = time.perf_counter() - wall_start
+            with self._lock:
+                usage = self._component(component)
+                usage.cpu_seconds += cpu
+                usage.wall_seconds += wall
+                usage.calls += 1
+
+    @contextmanager
+    def loading(self, component):
+        """Attribute RSS growth during the enclosed load to a component"""
+        before = _rss_mb(self._process)
+        try:
+            yield
+        finally:
+            after = _rss_mb(self._process)
+            if before is not None and after is not None:
+                with self._lock:
+                    self._component(component).load_rss_mb += max(0.0, after - before)
+
+    def report(self):
+        """Process totals, per-component usage and the local Ollama server if found"""
+        with self._lock:
+            components = {
+                name: {
+                    "cpu_s": round(u.cpu_seconds, 3),
+                    "wall_s": round(u.wall_seconds, 3),
+                    "calls": u.calls,
+                    "load_rss_mb": round(u.load_rss_mb, 1)
+                }
+                for name, u in sorted(self.usage.items())
+            }
+
+        rss = _rss_mb(self._process)
+        process = {"rss_mb": round(rss, 1) if rss is not None else None}
+        if self._process is not None:
+            times = self._process.cpu_times()
+            process["cpu_s"] = round(times.user + times.system, 3)
+            process["threads"] = self._process.num_threads()
+        else:
+            process["cpu_s"] = round(time.process_time(), 3)
+
+        report = {"process": process, "components": components, "thread_limits": dict(self.limits_applied)}
+        ollama = self._ollama_usage()
+        if ollama:
+            report["ollama"] = ollama
+        return report
+
+    def _ollama_usage(self):
+        if psutil is None:
+            return None
+        rss = cpu = 0.0
+        found = False
+        for proc in psutil.process_iter(["name", "memory_info", "cpu_times"]):
+            if (proc.info["name"] or "").lower().startswith("ollama") and proc.info["memory_info"]:
+                found = True
+                rss += proc.info["memory_info"].rss / 2 ** 20
+                cpu += proc.info["cpu_times"].user + proc.info["cpu_times"].system
+        return {"rss_mb": round(rss, 1), "cpu_s": round(cpu, 3)} if found else None
+
+    def print_report(self):
+        report = self.report()
+        process = report["process"]
+        print(f"🔋 Resources ({POWER_PROFILE} profile): RSS {process['rss_mb']} MB, CPU {process['cpu_s']} s")
+        for name, u in report["components"].items():
+            print(f"   {name:<12} cpu={u['cpu_s']:<9} calls={u['calls']:<6} load_rss={u['load_rss_mb']} MB")
+        if "ollama" in report:
+            print(f"   {'ollama':<12} cpu={report['ollama']['cpu_s']:<9} rss={report['ollama']['rss_mb']} MB")
+
+
+# Shared governor used by all components
+governor = ResourceGovernor()
+
+
+if __name__ == "__main__":
+    governor.apply_thread_limits()
+    print(f"Thread limits: {THREAD_LIMITS}")
+    governor.print_report()
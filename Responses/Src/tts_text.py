@@ -0,0 +1,31 @@
+"""
+TTS Text
+Turns LLM answers into text that speaks well; no audio dependencies, so the server can use it
+"""
+
+
+def clean_response_for_tts(response):
+    """Clean AI response for better TTS"""
+    if not response:
+        return "I couldn't generate a response. Please try again."
+    
+    # Remove excessive formatting
+    cleaned = response.replace('**', '').replace('*', '')
+    cleaned = cleaned.replace('⚠️', 'Warning:').replace('🚨', 'Emergency:')
+    cleaned = cleaned.replace('✅', 'Step:').replace('❌', 'Error:')
+    
+    # Remove excessive line breaks
+    cleaned = ' '.join(cleaned.split())
+    
+    # Limit length for TTS
+    # if len(cleaned) > 400:
+    #     sentences = cleaned.split('. ')
+    #     result = ""
+    #     for sentence in sentences:
+    #         if len(result + sentence) < 350:
+    #             result += sentence + ". "
+    #         else:
+    #             break
+    #     cleaned = result + "Ask for more details if needed."
+    
+    return cleaned.strip()
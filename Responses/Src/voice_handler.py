@@ -7,6 +7,8 @@ import time
 import os
 from vosk import Model, KaldiRecognizer
 from config import *
+from metrics import metrics
+from resource_governor import governor
 
 class VoiceHandler:
     def __init__(self):
@@ -19,7 +21,8 @@ class VoiceHandler:
         # Initialize Vosk STT
         try:
             print(f"🔄 Loading Vosk model from: {VOSK_MODEL_PATH}")
-            self.model = Model(VOSK_MODEL_PATH)
+            with governor.loading("stt"):
+                self.model = Model(VOSK_MODEL_PATH)
             self.recognizer = KaldiRecognizer(self.model, SAMPLE_RATE)
             print("✅ Vosk STT initialized")
         except Exception as e:
@@ -31,11 +34,13 @@ class VoiceHandler:
         self.tts_lock = threading.Lock()
         self.should_stop_tts = False
         self.is_speaking = False
+        self.speech_thread = None
         
         # Audio queue and state
         self.audio_queue = queue.Queue()
         self.is_listening = False
         self.pause_listening = False  # New: pause STT when speaking
+        self._callback_thread_raised = False
         
         print("✅ TTS initialized")
     
@@ -61,6 +66,7 @@ class VoiceHandler:
         
         # print(f"🔈 Speaking: {text[:100]}..." if len(text) > 100 else f"🔈 Speaking: {text}")
         print(f"🔈 Speaking: {text}")
+        requested_at = time.perf_counter()
         # Stop any current TTS
         # if self.is_speaking:
         self.stop_current_speech()
@@ -89,9 +95,13 @@ class VoiceHandler:
                             print("🛑 TTS interrupted")
                             break
                         
+                        if i == 0:
+                            metrics.record("tts_startup", time.perf_counter() - requested_at)
+                        
                         try:
-                            engine.say(chunk)
-                            engine.runAndWait()
+                            with governor.cpu("tts"):
+                                engine.say(chunk)
+                                engine.runAndWait()
                         except Exception as e:
                             print(f"TTS chunk {i} error: {e}")
                             break
@@ -115,6 +125,12 @@ class VoiceHandler:
         # Start speech thread
         speech_thread = threading.Thread(target=speak_thread, daemon=True)
         speech_thread.start()
+        self.speech_thread = speech_thread
+    
+    def wait_for_speech(self, timeout=60):
+        """Block until the current speak() call has finished"""
+        if self.speech_thread and self.speech_thread.is_alive():
+            self.speech_thread.join(timeout)
     
     def _split_text_into_chunks(self, text, max_length=1500):
         """Split text into manageable chunks"""
@@ -163,6 +179,7 @@ class VoiceHandler:
     def speak_urgent(self, text):
         """Immediate speech for urgent situations"""
         print(f"🚨 URGENT: {text}")
+        requested_at = time.perf_counter()
         
         # Stop current speech immediately
         self.stop_current_speech()
@@ -172,6 +189,7 @@ class VoiceHandler:
             engine = self._create_fresh_tts()
             if engine:
                 engine.setProperty('rate', TTS_RATE + 30)  # Faster for urgent
+                metrics.record("tts_urgent_startup", time.perf_counter() - requested_at)
                 engine.say(text)
                 engine.runAndWait()
                 engine.stop()
@@ -181,6 +199,11 @@ class VoiceHandler:
     
     def audio_callback(self, indata, frames, time, status):
         """Callback for audio input"""
+        if not self._callback_thread_raised:
+            # Runs on the audio driver's thread; boost it once
+            self._callback_thread_raised = True
+            governor.raise_current_thread()
+        
         if status:
             print(f"Audio input error: {status}")
         
@@ -210,8 +233,12 @@ class VoiceHandler:
                         
                         data = self.audio_queue.get(timeout=0.1)
                         
-                        if self.recognizer.AcceptWaveform(data):
+                        stt_start = time.perf_counter()
+                        with governor.cpu("stt"):
+                            final = self.recognizer.AcceptWaveform(data)
+                        if final:
                             result = json.loads(self.recognizer.Result())
+                            metrics.record("stt_finalize", time.perf_counter() - stt_start)
                             text = result.get("text", "").strip()
                             
                             if text: